@@ -1,85 +1,347 @@
+import hashlib
+
 import frappe
+from frappe.utils import add_to_date, get_datetime, now, now_datetime
+
+from vinfork_custom.bom_hash import find_matching_bom, get_bom_content_hash, reuse_bom
+from vinfork_custom.bom_templates import clone_bom_template, get_sofa_type
+from vinfork_custom.instrumentation import instrument
+
+# Background mode settings
+# Set "auto_bom_async": 0 in site_config.json to build BOMs inside the submit again
+AUTO_BOM_QUEUE = "long"
+AUTO_BOM_MAX_ATTEMPTS = 3
+AUTO_BOM_CLAIM_TTL = 60 * 60  # seconds an item stays claimed by a queued job
+AUTO_BOM_STATUS_KEY = "auto_bom_job_status"
+# Seconds a per-item status is kept: finished items briefly, failures long enough to be looked at
+AUTO_BOM_STATUS_TTL = {"Completed": 60 * 60, "Skipped": 60 * 60, "Failed": 7 * 24 * 60 * 60}
+AUTO_BOM_STATUS_DEFAULT_TTL = 24 * 60 * 60  # Queued, Running, Retrying
+AUTO_BOM_LOCK_TIMEOUT = 30  # seconds to wait for another worker building the same item
+# Failed items are retried after AUTO_BOM_RETRY_DELAY seconds, four times longer per attempt,
+# by the scheduler, so a lock timeout or deadlock is not retried against the same contention
+AUTO_BOM_RETRY_KEY = "auto_bom_retries"
+AUTO_BOM_RETRY_DELAY = 2 * 60
 
+
+@instrument
 def create_bom_on_submit(doc, method):
     """
     Called when a Sales Order is submitted.
     Checks each item; if it needs a BOM and doesn't have one, creates a dummy BOM
     with standard Operations (but NO materials) so Production Plan works.
+
+    By default the BOMs are built by a background job after the submit commits,
+    so a slow or failing BOM never holds up the Sales Order.
+    """
+    lines = get_items_needing_bom(doc)
+    if not lines:
+        return
+
+    if frappe.conf.get("auto_bom_async", 1):
+        enqueue_bom_creation(doc, lines)
+    else:
+        # Same lock order in every submit, so two orders sharing items can't deadlock
+        for item_code, order_type, sofa_type in sorted(lines):
+            make_auto_bom(item_code, order_type, doc.name, doc.company, doc.currency, sofa_type)
+
+
+def get_items_needing_bom(doc):
     """
-    # 1. List of Operations to add to every Auto-BOM
-    # (Update these names if your actual Operation names are different)
-    standard_operations = [
-        # {"operation": "Frame Making", "workstation": "Team Guddu", "time_in_mins": 60}, 
-        # Example - we will fetch just the operation names if user didn't specify details
-    ]
-    
-    # Fetch ALL active Operations dynamically from the system, capturing default workstation
-    # We use ignore_permissions=True to ensure background script can read them
-    # Fetch ALL active Operations dynamically from the system, capturing default workstation
-    # We use ignore_permissions=True to ensure background script can read them
-    # Fetch ALL active Operations dynamically from the system, capturing default workstation
-    # We use ignore_permissions=True to ensure background script can read them
-    ops_list = frappe.get_all("Operation", fields=["name", "workstation"], filters={}, ignore_permissions=True)
-
-    if not ops_list:
-        frappe.log_error("Auto-BOM: No Operations found. Creating BOM without operations.", "Auto BOM Warning")
-
-    # ... inside BOM creation ...
+    Returns [(item_code, order_type, sofa_type)] for the stock items of the Sales Order
+    that don't have an active BOM yet, one entry per item code.
+    """
+    # Resolve stock-item flags and existing BOMs for the whole order up front,
+    # so the number of queries doesn't grow with the number of lines
+    item_codes = _get_unique_item_codes(doc.items)
+    stock_items, items_with_bom = _prefetch_item_state(item_codes)
+
+    lines = []
+    seen = set()
     for item in doc.items:
+        # Repeated lines for the same model only need one BOM
+        if item.item_code in seen:
+            continue
+        seen.add(item.item_code)
+
         # Check if item is a stock item (manufacturing candidate)
-        is_stock_item = frappe.db.get_value("Item", item.item_code, "is_stock_item")
-        if not is_stock_item:
+        if item.item_code not in stock_items:
             continue
 
-        if not frappe.db.exists("BOM", {"item": item.item_code, "is_active": 1}):
+        if item.item_code not in items_with_bom:
             # Get order type from Sales Order Item
-            order_type = item.get("custom_order_type") or "Standard"
-            
-            bom = frappe.new_doc("BOM")
-            bom.item = item.item_code
-            bom.quantity = 1
-            bom.is_default = 1
-            bom.is_active = 1
-            bom.currency = doc.currency or "INR"
-            bom.company = doc.company 
-            
-            # Store metadata in BOM for later reference
-            # Create custom fields if needed: custom_order_type, custom_linked_sales_order
-            if frappe.db.has_column("BOM", "custom_order_type"):
-                bom.custom_order_type = order_type
-            if frappe.db.has_column("BOM", "custom_linked_sales_order"):
-                bom.custom_linked_sales_order = doc.name
-            
-            bom.with_operations = 1 # Force the checkbox to be checked
-            
-            # Add Operations
-            for op in ops_list:
-                row = bom.append("operations", {})
-                row.operation = op.name
-                row.workstation = op.workstation # CRITICAL: Explicitly set the workstation
-                row.time_in_mins = 60 
-            
-            # Add Dummy Raw Material ("Test 1")
-            dummy_item = "Test 1"
-            if not frappe.db.exists("Item", dummy_item):
-                # Auto-create the dummy item if it doesn't exist
-                di = frappe.new_doc("Item")
-                di.item_code = dummy_item
-                di.item_group = "Raw Material"
-                di.stock_uom = "Nos"
-                di.is_stock_item = 1
-                di.valuation_rate = 0
-                di.description = "Placeholder item for Auto-BOM"
-                di.save(ignore_permissions=True)
-                frappe.msgprint(f"⚠️ Created missing dummy item: {dummy_item}")
-
-            if frappe.db.exists("Item", dummy_item):
-                rm_row = bom.append("items", {})
-                rm_row.item_code = dummy_item
-                rm_row.qty = 1
-                rm_row.rate = 0 # Assume 0 cost for dummy
-            else:
-                 frappe.throw(f"Auto-BOM Failed: Item '{dummy_item}' is missing and could not be created.")
-
-            bom.save(ignore_permissions=True)
-            bom.submit()
+            lines.append((item.item_code, item.get("custom_order_type") or "Standard",
+                          get_sofa_type(item.item_code, item.item_name)))
+
+    return lines
+
+
+def make_auto_bom(item_code, order_type, sales_order, company, currency, sofa_type=None):
+    """
+    Build, save and submit the placeholder BOM for one item. Returns the BOM name.
+    The BOM is cloned from the prebuilt template of the item's sofa type.
+
+    Single-flight per item: the item's lock is held until the transaction ends, and
+    a worker that waited for it reuses the BOM the other worker committed.
+    """
+    _lock_item(item_code)
+
+    existing = _get_committed_bom(item_code)
+    if existing:
+        return existing
+
+    bom = clone_bom_template(sofa_type, item_code, company, currency,
+                             order_type=order_type, sales_order=sales_order)
+
+    # An identical placeholder that was deactivated earlier is switched back on instead
+    match = find_matching_bom(item_code, get_bom_content_hash(bom), order_type, sales_order)
+    if match:
+        return reuse_bom(match, make_default=True)
+
+    bom.save(ignore_permissions=True)
+    bom.submit()
+
+    return bom.name
+
+
+def enqueue_bom_creation(doc, lines):
+    """
+    Queues one job for the Sales Order with the items it has to build.
+    Items already claimed by another order's job are left to that job,
+    so two orders for the same new model don't both build a BOM.
+    """
+    claimed = [line for line in lines if _claim_item(line[0], doc.name)]
+    if not claimed:
+        return
+
+    # If the submit fails, the job is never queued, so hand the items back
+    frappe.db.after_rollback.add(lambda: [_release_item(line[0]) for line in claimed])
+
+    for item_code, *_ in claimed:
+        _set_job_status(item_code, "Queued", doc.name)
+
+    frappe.enqueue(
+        "vinfork_custom.auto_bom.create_boms_for_sales_order",
+        queue=AUTO_BOM_QUEUE,
+        job_id=f"auto_bom::{doc.name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        sales_order=doc.name,
+        company=doc.company,
+        currency=doc.currency,
+        lines=claimed,
+    )
+
+
+def create_boms_for_sales_order(sales_order, company, currency, lines, attempt=1):
+    """
+    Background job: builds the Auto-BOMs for one Sales Order.
+    Each BOM is committed on its own; failed items are retried by a new job
+    up to AUTO_BOM_MAX_ATTEMPTS times before they are marked Failed.
+    """
+    _, items_with_bom = _prefetch_item_state([line[0] for line in lines])
+    # End the read snapshot, so each item's check after its lock is a fresh read
+    frappe.db.commit()
+
+    failed = []
+    for item_code, order_type, sofa_type in lines:
+        if item_code in items_with_bom:
+            # Created meanwhile (manually or by the inline mode)
+            _set_job_status(item_code, "Skipped", sales_order, attempt)
+            _release_item(item_code)
+            continue
+
+        _set_job_status(item_code, "Running", sales_order, attempt)
+        try:
+            bom_name = make_auto_bom(item_code, order_type, sales_order, company, currency, sofa_type)
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            error = frappe.get_traceback()
+            frappe.log_error(f"Auto-BOM failed for {item_code} (Sales Order {sales_order}, attempt {attempt})\n\n{error}",
+                             "Auto BOM Error")
+            failed.append((item_code, order_type, sofa_type))
+            _set_job_status(item_code, "Failed" if attempt >= AUTO_BOM_MAX_ATTEMPTS else "Retrying",
+                            sales_order, attempt, error=error)
+            continue
+
+        _set_job_status(item_code, "Completed", sales_order, attempt, bom=bom_name)
+        _release_item(item_code)
+
+    if not failed:
+        return
+
+    if attempt < AUTO_BOM_MAX_ATTEMPTS:
+        for item_code, *_ in failed:
+            _claim_item(item_code, sales_order, refresh=True)
+
+        delay = AUTO_BOM_RETRY_DELAY * 4 ** (attempt - 1)
+        frappe.cache.hset(AUTO_BOM_RETRY_KEY, f"{sales_order}::{attempt + 1}", {
+            "due": str(add_to_date(now_datetime(), seconds=delay)),
+            "sales_order": sales_order,
+            "company": company,
+            "currency": currency,
+            "lines": failed,
+            "attempt": attempt + 1,
+        })
+    else:
+        for item_code, *_ in failed:
+            _release_item(item_code)
+
+
+def enqueue_due_retries():
+    """scheduler_events (all): queues the Auto-BOM retries whose backoff has passed"""
+    retries = frappe.cache.hgetall(AUTO_BOM_RETRY_KEY)
+    for key, retry in retries.items():
+        if get_datetime(retry["due"]) > now_datetime():
+            continue
+
+        key = frappe.safe_decode(key)
+        frappe.cache.hdel(AUTO_BOM_RETRY_KEY, key)
+        for item_code, *_ in retry["lines"]:
+            # Keep the claim over the wait for the next free worker
+            _claim_item(item_code, retry["sales_order"], refresh=True)
+
+        frappe.enqueue(
+            "vinfork_custom.auto_bom.create_boms_for_sales_order",
+            queue=AUTO_BOM_QUEUE,
+            job_id=f"auto_bom::{key}",
+            deduplicate=True,
+            sales_order=retry["sales_order"],
+            company=retry["company"],
+            currency=retry["currency"],
+            lines=retry["lines"],
+            attempt=retry["attempt"],
+        )
+
+
+@frappe.whitelist()
+@instrument
+def get_auto_bom_status(item_code=None):
+    """Background Auto-BOM status for one item, or for every tracked item"""
+    # Failed statuses carry full tracebacks
+    if not frappe.has_permission("BOM", "read"):
+        frappe.throw("You do not have permission to read BOMs.", frappe.PermissionError)
+
+    if item_code:
+        return frappe.cache.get_value(_get_status_key(item_code))
+
+    prefix = frappe.cache.make_key(_get_status_key(""))
+    statuses = {}
+    for key in frappe.cache.get_keys(_get_status_key("")):
+        item = frappe.safe_decode(key)[len(prefix):]
+        status = frappe.cache.get_value(_get_status_key(item))
+        if status:
+            statuses[item] = status
+
+    return statuses
+
+
+def _claim_item(item_code, sales_order, refresh=False):
+    """Marks the item as being built by this order's job. Returns False if another job has it."""
+    key = frappe.cache.make_key(f"auto_bom_claim:{item_code}")
+    if refresh:
+        return frappe.cache.set(key, sales_order, ex=AUTO_BOM_CLAIM_TTL)
+
+    return bool(frappe.cache.set(key, sales_order, ex=AUTO_BOM_CLAIM_TTL, nx=True))
+
+
+def _release_item(item_code):
+    frappe.cache.delete_value(f"auto_bom_claim:{item_code}")
+
+
+def _lock_item(item_code):
+    """
+    Takes the item's named database lock for the rest of the transaction.
+    Named locks belong to the connection and survive commit and rollback, so both release them.
+    """
+    held = _get_held_locks()
+    name = _get_lock_name(item_code)
+    if name in held:
+        return
+
+    acquired = frappe.db.sql("SELECT GET_LOCK(%s, %s)", (name, AUTO_BOM_LOCK_TIMEOUT))[0][0]
+    if not acquired:
+        frappe.throw(f"Timed out waiting for another Auto-BOM of {item_code} to finish. Please try again.",
+                     frappe.QueryTimeoutError)
+
+    held.add(name)
+    frappe.db.after_commit.add(lambda: _unlock_item(name))
+    frappe.db.after_rollback.add(lambda: _unlock_item(name))
+
+
+def _get_committed_bom(item_code):
+    """
+    Active BOM of the item, read after taking the item's lock.
+    The BOM lookup is a plain consistent read, which sees the other worker's BOM
+    when it is the first read of the transaction (the background job commits first).
+    Inside a Sales Order submit the snapshot is older, so the item's default_bom is
+    also read with a primary-key locking read: that returns the latest committed value
+    and locks only the Item row, never an index gap shared with other items.
+    """
+    existing = frappe.db.get_value("BOM", {"item": item_code, "is_active": 1}, "name")
+    if existing:
+        return existing
+
+    return frappe.db.get_value("Item", item_code, "default_bom", for_update=True)
+
+
+def _unlock_item(name):
+    held = _get_held_locks()
+    if name in held:
+        held.discard(name)
+        frappe.db.sql("SELECT RELEASE_LOCK(%s)", (name,))
+
+
+def _get_held_locks():
+    if not hasattr(frappe.local, "auto_bom_locks"):
+        frappe.local.auto_bom_locks = set()
+
+    return frappe.local.auto_bom_locks
+
+
+def _get_lock_name(item_code):
+    # Lock names are server-wide and at most 64 characters
+    return "auto_bom:" + hashlib.sha1(f"{frappe.local.site}:{item_code}".encode()).hexdigest()
+
+
+def _set_job_status(item_code, status, sales_order, attempt=0, bom=None, error=None):
+    """One key per item, so every status expires on its own"""
+    frappe.cache.set_value(_get_status_key(item_code), {
+        "status": status,
+        "sales_order": sales_order,
+        "attempt": attempt,
+        "bom": bom,
+        "error": error,
+        "modified": now(),
+    }, expires_in_sec=AUTO_BOM_STATUS_TTL.get(status, AUTO_BOM_STATUS_DEFAULT_TTL))
+
+
+def _get_status_key(item_code):
+    return f"{AUTO_BOM_STATUS_KEY}:{item_code}"
+
+
+def _get_unique_item_codes(items):
+    """Return the item codes of the order lines, deduplicated, in line order"""
+    return list(dict.fromkeys(item.item_code for item in items if item.item_code))
+
+
+def _prefetch_item_state(item_codes):
+    """
+    Returns (stock_items, items_with_bom) for the given item codes:
+    the codes flagged as stock items and the codes that already have an active BOM.
+    One query each, regardless of how many codes are passed.
+    """
+    if not item_codes:
+        return set(), set()
+
+    stock_items = set(frappe.get_all("Item",
+                                     filters={"name": ["in", item_codes], "is_stock_item": 1},
+                                     pluck="name", ignore_permissions=True))
+    if not stock_items:
+        return stock_items, set()
+
+    items_with_bom = set(frappe.get_all("BOM",
+                                        filters={"item": ["in", list(stock_items)], "is_active": 1},
+                                        pluck="item", distinct=True, ignore_permissions=True))
+
+    return stock_items, items_with_bom
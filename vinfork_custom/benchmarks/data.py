@@ -0,0 +1,115 @@
+"""
+Synthetic volume for the benchmarks: Items, Sales Orders with many lines,
+completed Work Orders with a Job Card per Operation and Manufacture Stock Entries.
+Rows are bulk-inserted straight into the tables, so setup stays fast and the
+measured entry points see the same shape of data as production.
+Everything is created inside the caller's transaction and meant to be rolled back.
+"""
+
+import random
+
+import frappe
+from frappe.utils import add_days, now, nowdate
+
+from vinfork_custom.bom_templates import get_model_sofa_types
+
+PREFIX = "_BENCH"
+
+
+def make_items(count, seed=0):
+	"""Finished-good items named like sofa models, so Auto-BOM resolves a sofa type"""
+	rng = random.Random(seed)
+	models = sorted(get_model_sofa_types()) or ["MODEL"]
+	item_group = frappe.db.get_value("Item Group", {"is_group": 0}, "name")
+
+	names = [f"{rng.choice(models)} {PREFIX}-{seed}-{i}" for i in range(count)]
+	_bulk_insert("Item", ["item_code", "item_name", "description", "stock_uom", "item_group", "is_stock_item"],
+		[(name, name, name, "Nos", item_group, 1) for name in names], names=names)
+
+	return names
+
+
+def make_raw_materials(count, seed=0):
+	item_group = frappe.db.get_value("Item Group", {"is_group": 0}, "name")
+	names = [f"{PREFIX}-RM-{seed}-{i}" for i in range(count)]
+	_bulk_insert("Item", ["item_code", "item_name", "description", "stock_uom", "item_group", "is_stock_item"],
+		[(name, name, name, "Nos", item_group, 1) for name in names], names=names)
+
+	return names
+
+
+def make_sales_order_docs(orders, lines, items, company, seed=0):
+	"""In-memory Sales Orders for create_bom_on_submit, lines drawn from items (with repeats)"""
+	rng = random.Random(seed)
+	currency = frappe.get_cached_value("Company", company, "default_currency")
+
+	return [
+		frappe._dict(
+			name=f"{PREFIX}-SO-{seed}-{o}",
+			company=company,
+			currency=currency,
+			items=[
+				frappe._dict(item_code=item, item_name=item, custom_order_type="Standard")
+				for item in (rng.choice(items) for _ in range(lines))
+			],
+		)
+		for o in range(orders)
+	]
+
+
+def make_work_orders(items, per_item, company, operations, raw_materials, seed=0):
+	"""
+	Completed Work Orders for items that have a default BOM, each with one Job Card
+	per Operation and one Manufacture Stock Entry. Returns the Work Order names.
+	"""
+	rng = random.Random(seed)
+	boms = dict(frappe.get_all("BOM", filters={"item": ["in", items], "is_default": 1}, fields=["item", "name"],
+		as_list=True))
+
+	statuses = ["Open", "Work In Progress", "Completed"]
+	today = nowdate()
+
+	work_orders, job_cards, stock_entries, se_details = [], [], [], []
+	for item in items:
+		if item not in boms:
+			continue
+
+		for _ in range(per_item):
+			wo = f"{PREFIX}-WO-{seed}-{len(work_orders)}"
+			qty = rng.randint(1, 5)
+			start = add_days(today, -rng.randint(0, 25))
+			work_orders.append((wo, item, boms[item], qty, "Completed", 1, start, add_days(start, 5),
+				add_days(start, 6), company))
+
+			for op in operations:
+				job_cards.append((f"{wo}-{op}", wo, op, rng.choice(statuses), rng.choice([0, 1])))
+
+			se = f"{PREFIX}-SE-{seed}-{len(stock_entries)}"
+			stock_entries.append((se, "Manufacture", wo, 1, start, "10:00:00", qty))
+			idx = 1
+			for rm in rng.sample(raw_materials, min(len(raw_materials), 8)):
+				se_details.append((f"{se}-{idx}", se, "Stock Entry", "items", idx, rm, qty * rng.uniform(1, 4),
+					rng.uniform(10, 500), 0, 0))
+				idx += 1
+			se_details.append((f"{se}-{idx}", se, "Stock Entry", "items", idx, item, qty, 0, 1, 0))
+
+	_bulk_insert("Work Order", ["production_item", "bom_no", "qty", "status", "docstatus", "planned_start_date",
+		"planned_end_date", "actual_end_date", "company"],
+		[row[1:] for row in work_orders], names=[row[0] for row in work_orders])
+	_bulk_insert("Job Card", ["work_order", "operation", "status", "docstatus"],
+		[row[1:] for row in job_cards], names=[row[0] for row in job_cards])
+	_bulk_insert("Stock Entry", ["purpose", "work_order", "docstatus", "posting_date", "posting_time",
+		"fg_completed_qty"],
+		[row[1:] for row in stock_entries], names=[row[0] for row in stock_entries])
+	_bulk_insert("Stock Entry Detail", ["parent", "parenttype", "parentfield", "idx", "item_code", "qty",
+		"basic_rate", "is_finished_item", "is_scrap_item"],
+		[row[1:] for row in se_details], names=[row[0] for row in se_details])
+
+	return [row[0] for row in work_orders]
+
+
+def _bulk_insert(doctype, fields, values, names):
+	timestamp = now()
+	user = frappe.session.user
+	frappe.db.bulk_insert(doctype, ["name", *fields, "creation", "modified", "owner", "modified_by"],
+		[(name, *row, timestamp, timestamp, user, user) for name, row in zip(names, values, strict=True)])
@@ -0,0 +1,220 @@
+"""
+Benchmarks the app's hot paths against synthetic data on a local site:
+
+	bench --site test_site execute vinfork_custom.benchmarks.run.run
+	bench --site test_site execute vinfork_custom.benchmarks.run.run --kwargs "{'scales': [[10, 40, 2]]}"
+
+A scale is (Sales Orders, lines per Sales Order, Work Orders per item). For every
+scale the data is generated, each entry point is measured for wall time, query count,
+time spent in queries and peak Python memory, and the transaction is rolled back,
+so the site is left as it was. Results are written to sites/<site>/private/benchmarks
+as <timestamp>-<commit>.json and compared with the last run from another commit.
+"""
+
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import add_days, now_datetime, nowdate
+
+from vinfork_custom.benchmarks import data
+from vinfork_custom.instrumentation import count_queries
+
+DEFAULT_SCALES = ((5, 10, 1), (20, 40, 2), (50, 80, 3))
+RAW_MATERIALS = 40
+# update_bom_from_actuals is measured per call, on this many Work Orders
+BOM_TOOL_SAMPLE = 20
+# Changes smaller than this share are reported as noise
+REGRESSION_THRESHOLD = 0.2
+
+
+def run(scales=None, trace_memory=1):
+	"""
+	Runs every scale and saves the results. tracemalloc slows Python code down,
+	so pass trace_memory=0 for wall times closer to production.
+	"""
+	if not (frappe.conf.get("allow_tests") or frappe.conf.get("developer_mode")):
+		frappe.throw("Benchmarks write to the database; enable allow_tests or developer_mode on the site first.")
+
+	company = frappe.defaults.get_global_default("company") or frappe.db.get_value("Company", {}, "name")
+	operations = [op.name for op in _get_operations()]
+
+	results = []
+	for seed, (orders, lines, per_item) in enumerate(scales or DEFAULT_SCALES):
+		try:
+			results.append(_run_scale(seed, orders, lines, per_item, company, operations, trace_memory))
+		finally:
+			frappe.db.rollback()
+
+	report = {
+		"commit": _get_commit(),
+		"timestamp": str(now_datetime()),
+		"site": frappe.local.site,
+		"trace_memory": bool(trace_memory),
+		"results": results,
+	}
+	previous = _load_previous(report["commit"])
+	path = _save(report)
+
+	_print_report(report, previous)
+	print(f"\nSaved to {path}")
+
+	return report
+
+
+def _run_scale(seed, orders, lines, per_item, company, operations, trace_memory):
+	scale = {"sales_orders": orders, "lines": lines, "work_orders_per_item": per_item}
+	print(f"\nScale {orders} SO x {lines} lines, {per_item} WO per item")
+
+	# Distinct items are a fraction of all lines, as repeat models are common
+	items = data.make_items(max(1, orders * lines // 4), seed=seed)
+	raw_materials = data.make_raw_materials(RAW_MATERIALS, seed=seed)
+	sales_orders = data.make_sales_order_docs(orders, lines, items, company, seed=seed)
+
+	measurements = {}
+
+	from vinfork_custom.auto_bom import create_bom_on_submit
+
+	# Build BOMs inline: queued jobs would only run after a commit that never happens.
+	# @instrument would add its own cache writes to the measured queries and time
+	with _conf(auto_bom_async=0, production_status_cache_ttl=0, vinfork_instrumentation=0):
+		measurements["create_bom_on_submit"] = _measure(
+			lambda: [create_bom_on_submit(so, "on_submit") for so in sales_orders], trace_memory, calls=orders)
+
+		work_orders = data.make_work_orders(items, per_item, company, operations, raw_materials, seed=seed)
+		_refresh_snapshot(work_orders)
+		scale["work_orders"] = len(work_orders)
+
+		from vinfork_custom.report.production_status_report.production_status_report import execute
+
+		filters = frappe._dict(from_date=add_days(nowdate(), -30), to_date=nowdate())
+		measurements["production_status_report.execute"] = _measure(lambda: execute(filters), trace_memory)
+
+		from vinfork_custom.bom_update_tool import update_bom_from_actuals
+
+		sample = work_orders[:BOM_TOOL_SAMPLE]
+		frappe.flags.mute_messages = True
+		try:
+			measurements["update_bom_from_actuals"] = _measure(
+				lambda: [update_bom_from_actuals(wo) for wo in sample], trace_memory, calls=len(sample))
+		finally:
+			frappe.flags.mute_messages = False
+
+	for name, m in measurements.items():
+		print(f"  {name}: {m['wall_ms']:.1f} ms, {m['queries']} queries, {m['peak_memory_kb']:.0f} KiB peak")
+
+	return {"scale": scale, "measurements": measurements}
+
+
+def _measure(fn, trace_memory=True, calls=1):
+	"""Wall time, queries and peak memory of fn(), with per-call figures when it covers several calls"""
+	with count_queries() as counter:
+		if trace_memory:
+			tracemalloc.start()
+		start = time.perf_counter()
+		try:
+			fn()
+		finally:
+			wall_ms = (time.perf_counter() - start) * 1000
+			peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+			if trace_memory:
+				tracemalloc.stop()
+
+	calls = max(calls, 1)
+	return {
+		"calls": calls,
+		"wall_ms": wall_ms,
+		"wall_ms_per_call": wall_ms / calls,
+		"queries": counter.queries,
+		"queries_per_call": counter.queries / calls,
+		"db_ms": counter.db_ms,
+		"peak_memory_kb": peak / 1024,
+	}
+
+
+@contextmanager
+def _conf(**values):
+	previous = {key: frappe.local.conf.get(key) for key in values}
+	frappe.local.conf.update(values)
+	try:
+		yield
+	finally:
+		for key, value in previous.items():
+			if value is None:
+				frappe.local.conf.pop(key, None)
+			else:
+				frappe.local.conf[key] = value
+
+
+def _get_operations():
+	from vinfork_custom.operation_catalogue import get_operation_catalogue
+
+	return get_operation_catalogue()
+
+
+def _refresh_snapshot(work_orders):
+	"""The synthetic rows bypass doc events, so bring the report snapshot up to date by hand"""
+	from vinfork_custom.production_status_snapshot import is_snapshot_ready, refresh_work_orders
+
+	if is_snapshot_ready():
+		refresh_work_orders(work_orders)
+
+
+def _get_commit():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+			cwd=frappe.get_app_path("vinfork_custom", ".."), text=True).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+
+
+def _get_results_dir():
+	path = frappe.get_site_path("private", "benchmarks")
+	os.makedirs(path, exist_ok=True)
+	return path
+
+
+def _save(report):
+	path = os.path.join(_get_results_dir(),
+		f"{report['timestamp'][:19].replace(' ', 'T').replace(':', '')}-{report['commit']}.json")
+	with open(path, "w") as f:
+		json.dump(report, f, indent=1, default=str)
+
+	return path
+
+
+def _load_previous(commit):
+	"""Most recent saved run from a different commit"""
+	results_dir = _get_results_dir()
+	for file_name in sorted(os.listdir(results_dir), reverse=True):
+		if not file_name.endswith(".json") or file_name.endswith(f"-{commit}.json"):
+			continue
+
+		with open(os.path.join(results_dir, file_name)) as f:
+			return json.load(f)
+
+
+def _print_report(report, previous=None):
+	if not previous:
+		return
+
+	print(f"\nCompared with {previous['commit']} ({previous['timestamp']}):")
+	baseline = {json.dumps(r["scale"], sort_keys=True): r["measurements"] for r in previous["results"]}
+	for result in report["results"]:
+		old = baseline.get(json.dumps(result["scale"], sort_keys=True))
+		if not old:
+			continue
+
+		for name, m in result["measurements"].items():
+			if name not in old:
+				continue
+
+			for metric in ("wall_ms_per_call", "queries_per_call", "peak_memory_kb"):
+				before, after = old[name].get(metric) or 0, m[metric]
+				change = (after - before) / before if before else 0
+				flag = "  REGRESSION" if change > REGRESSION_THRESHOLD else ""
+				print(f"  {name} {metric}: {before:.1f} -> {after:.1f} ({change:+.0%}){flag}")
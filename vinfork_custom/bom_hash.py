@@ -0,0 +1,81 @@
+import hashlib
+
+import frappe
+from frappe.utils import flt
+
+from vinfork_custom.instrumentation import instrument
+
+HASH_FIELD = "custom_content_hash"
+
+# Quantities within this step count as equal ("bom_hash_qty_tolerance" in site_config.json)
+DEFAULT_QTY_TOLERANCE = 0.001
+
+
+def get_bom_content_hash(bom):
+	"""
+	Normalized hash of a BOM's materials: sorted item codes with their quantity
+	per unit of the BOM, rounded to the configured tolerance.
+	Two BOMs with the same hash consume the same materials.
+	"""
+	tolerance = flt(frappe.conf.get("bom_hash_qty_tolerance")) or DEFAULT_QTY_TOLERANCE
+	quantity = flt(bom.get("quantity")) or 1
+
+	qty_by_item = {}
+	for row in bom.get("items") or []:
+		qty_by_item[row.get("item_code")] = qty_by_item.get(row.get("item_code"), 0) + flt(row.get("qty"))
+
+	content = ";".join(
+		f"{item_code}:{round(qty / quantity / tolerance)}" for item_code, qty in sorted(qty_by_item.items())
+	)
+
+	return hashlib.sha1(content.encode()).hexdigest()
+
+
+@instrument
+def set_content_hash(doc, method=None):
+	"""doc_events hook for BOM validate"""
+	if frappe.db.has_column("BOM", HASH_FIELD):
+		doc.set(HASH_FIELD, get_bom_content_hash(doc))
+
+
+def find_matching_bom(item_code, content_hash, order_type=None, sales_order=None):
+	"""
+	The newest submitted BOM of the item with this content hash and order type, or None.
+	Standard matches untagged BOMs too; Customization/NPD variants only match
+	variants of the same Sales Order, so one customer's variant is never reused for another.
+	"""
+	if not frappe.db.has_column("BOM", HASH_FIELD):
+		return None
+
+	filters = {"item": item_code, HASH_FIELD: content_hash, "docstatus": 1}
+	or_filters = None
+	if frappe.db.has_column("BOM", "custom_order_type"):
+		order_type = order_type or "Standard"
+		if order_type.lower() == "standard":
+			or_filters = [["custom_order_type", "=", order_type], ["custom_order_type", "is", "not set"]]
+		else:
+			filters["custom_order_type"] = order_type
+			if frappe.db.has_column("BOM", "custom_linked_sales_order"):
+				filters["custom_linked_sales_order"] = sales_order or ""
+
+	matches = frappe.get_all("BOM", filters=filters, or_filters=or_filters,
+		fields=["name", "is_active", "is_default"], order_by="creation desc", limit=1)
+
+	return matches[0] if matches else None
+
+
+def reuse_bom(bom, make_default=True):
+	"""
+	Make a matching BOM (as returned by find_matching_bom) active again and,
+	if asked, the item's default instead of submitting an identical copy.
+	"""
+	if not bom.is_active:
+		frappe.db.set_value("BOM", bom.name, "is_active", 1)
+
+	if make_default and not bom.is_default:
+		item_code = frappe.db.get_value("BOM", bom.name, "item")
+		frappe.db.set_value("BOM", {"item": item_code, "is_default": 1, "name": ["!=", bom.name]}, "is_default", 0)
+		frappe.db.set_value("BOM", bom.name, "is_default", 1)
+		frappe.db.set_value("Item", item_code, "default_bom", bom.name)
+
+	return bom.name
@@ -0,0 +1,292 @@
+import hashlib
+import math
+
+import frappe
+from frappe.utils import flt, now
+
+from vinfork_custom.bom_update_tool import get_actual_items
+from vinfork_custom.instrumentation import instrument
+
+# Running per-item, per-material consumption statistics, one row per (item_code, material).
+# The row with material = "" counts the Manufacture entries seen for the item.
+STATS_TABLE = "__vinfork_bom_consumption_stats"
+ITEM_TOTAL = ""
+
+# Weight of the newest entry in the exponentially weighted mean ("bom_learning_alpha" in site_config.json)
+DEFAULT_ALPHA = 0.3
+LOCK_TIMEOUT = 30  # seconds to wait for another submit of the same item
+
+
+def create_stats_table():
+	frappe.db.sql_ddl(f"""
+		CREATE TABLE IF NOT EXISTS `{STATS_TABLE}` (
+			`item_code` VARCHAR(140) NOT NULL,
+			`material` VARCHAR(140) NOT NULL,
+			`count` INT NOT NULL DEFAULT 0,
+			`mean` DOUBLE NOT NULL DEFAULT 0,
+			`m2` DOUBLE NOT NULL DEFAULT 0,
+			`ewma` DOUBLE NOT NULL DEFAULT 0,
+			`last_rate` DOUBLE NOT NULL DEFAULT 0,
+			`last_stock_entry` VARCHAR(140),
+			`modified` DATETIME(6),
+			PRIMARY KEY (`item_code`, `material`)
+		) ENGINE=InnoDB ROW_FORMAT=DYNAMIC CHARACTER SET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+	""")
+
+
+@instrument
+def record_stock_entry(doc, method=None):
+	"""
+	doc_events hook for Stock Entry on_submit.
+	Folds the per-unit consumption of a Manufacture entry into the running statistics.
+	Only the materials of this entry are read and written, history is never rescanned.
+	"""
+	observation = _get_observation(doc)
+	if observation:
+		update_stats(*observation, stock_entry=doc.name)
+
+
+@instrument
+def reverse_stock_entry(doc, method=None):
+	"""doc_events hook for Stock Entry on_cancel: takes the entry back out of the statistics"""
+	observation = _get_observation(doc)
+	if observation:
+		remove_stats(observation[0], observation[1], stock_entry=doc.name)
+
+
+def _get_observation(doc):
+	"""(item_code, {material: per-unit qty}, {material: rate}) of a Manufacture entry, or None"""
+	if doc.purpose != "Manufacture" or not doc.work_order:
+		return None
+
+	# The table comes from a patch or after_install; don't fail submits on a site that has neither
+	if STATS_TABLE not in frappe.db.get_tables():
+		return None
+
+	finished = [row.item_code for row in doc.items if row.is_finished_item]
+	if not finished:
+		return None
+
+	actual_items, qty_produced = get_actual_items(doc.items, doc.fg_completed_qty)
+	if not actual_items or not qty_produced:
+		return None
+
+	samples = {}
+	rates = {}
+	for row in actual_items:
+		samples[row["item_code"]] = samples.get(row["item_code"], 0) + flt(row["qty_consumed"]) / qty_produced
+		rates[row["item_code"]] = flt(row["rate"])
+
+	return finished[0], samples, rates
+
+
+def update_stats(item_code, samples, rates=None, stock_entry=None):
+	"""
+	Adds one observation per material ({material: per-unit qty}) for the item.
+	Mean and variance use Welford's update, so each row changes in O(1).
+	"""
+	alpha = _get_alpha()
+	rates = rates or {}
+	materials = [ITEM_TOTAL, *samples]
+	current = _get_current(item_code, materials)
+
+	timestamp = now()
+	values = []
+	for material in materials:
+		row = current.get(material) or frappe._dict(count=0, mean=0, m2=0, ewma=0, last_rate=0)
+		x = samples.get(material, 0)
+
+		count = row.count + 1
+		delta = x - row.mean
+		mean = row.mean + delta / count
+		m2 = row.m2 + delta * (x - mean)
+		ewma = x if count == 1 else alpha * x + (1 - alpha) * row.ewma
+		last_rate = rates.get(material, row.last_rate)
+
+		values.append((item_code, material, count, mean, m2, ewma, last_rate, stock_entry, timestamp))
+
+	_write_stats(values)
+
+
+def remove_stats(item_code, samples, stock_entry=None):
+	"""
+	Takes one observation back out, the inverse of update_stats, also O(1) per row.
+	The EWMA can only be unwound when this entry was the last one folded in;
+	otherwise it is left as it is and fades out with the next entries.
+	"""
+	alpha = _get_alpha()
+	materials = [ITEM_TOTAL, *samples]
+	current = _get_current(item_code, materials)
+
+	timestamp = now()
+	values = []
+	for material in materials:
+		row = current.get(material)
+		if not row or row.count < 1:
+			continue
+
+		x = samples.get(material, 0)
+		count = row.count - 1
+		if count:
+			mean = (row.mean * row.count - x) / count
+			m2 = max(row.m2 - (x - mean) * (x - row.mean), 0)
+		else:
+			mean = m2 = 0
+
+		ewma, last_entry = row.ewma, row.last_stock_entry
+		if stock_entry and row.last_stock_entry == stock_entry:
+			last_entry = None
+			if count > 1 and alpha < 1:
+				ewma = (row.ewma - alpha * x) / (1 - alpha)
+		if count <= 1:
+			# Nothing or a single observation left, which is its own average
+			ewma = mean
+
+		values.append((item_code, material, count, mean, m2, ewma, row.last_rate, last_entry, timestamp))
+
+	_write_stats(values)
+
+
+def _get_alpha():
+	return flt(frappe.conf.get("bom_learning_alpha")) or DEFAULT_ALPHA
+
+
+def _get_current(item_code, materials):
+	"""
+	The item's rows for the materials, locked until the transaction ends.
+	A locking read of a missing key would take a gap lock that other items' submits
+	can share and deadlock on, so missing rows are first inserted as zeros under the
+	item's named lock; the locking read then only takes record locks on existing rows.
+	"""
+	_lock_item(item_code)
+
+	placeholders = ", ".join(["(%s, %s)"] * len(materials))
+	frappe.db.sql(f"""
+		INSERT IGNORE INTO `{STATS_TABLE}` (item_code, material)
+		VALUES {placeholders}
+	""", [v for material in materials for v in (item_code, material)])
+
+	return {
+		row.material: row
+		for row in frappe.db.sql(f"""
+			SELECT material, `count`, mean, m2, ewma, last_rate, last_stock_entry
+			FROM `{STATS_TABLE}`
+			WHERE item_code = %s AND material IN %s
+			FOR UPDATE
+		""", (item_code, materials), as_dict=1)
+	}
+
+
+def _lock_item(item_code):
+	"""
+	Takes the item's named database lock for the rest of the transaction.
+	Named locks belong to the connection and survive commit and rollback, so both release them.
+	"""
+	held = _get_held_locks()
+	name = "bom_learning:" + hashlib.sha1(f"{frappe.local.site}:{item_code}".encode()).hexdigest()
+	if name in held:
+		return
+
+	if not frappe.db.sql("SELECT GET_LOCK(%s, %s)", (name, LOCK_TIMEOUT))[0][0]:
+		frappe.throw(f"Timed out waiting for another Manufacture entry of {item_code}. Please try again.",
+			frappe.QueryTimeoutError)
+
+	held.add(name)
+	frappe.db.after_commit.add(lambda: _unlock_item(name))
+	frappe.db.after_rollback.add(lambda: _unlock_item(name))
+
+
+def _unlock_item(name):
+	held = _get_held_locks()
+	if name in held:
+		held.discard(name)
+		frappe.db.sql("SELECT RELEASE_LOCK(%s)", (name,))
+
+
+def _get_held_locks():
+	if not hasattr(frappe.local, "bom_learning_locks"):
+		frappe.local.bom_learning_locks = set()
+
+	return frappe.local.bom_learning_locks
+
+
+def _write_stats(values):
+	if not values:
+		return
+
+	placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(values))
+	frappe.db.sql(f"""
+		INSERT INTO `{STATS_TABLE}`
+			(item_code, material, `count`, mean, m2, ewma, last_rate, last_stock_entry, modified)
+		VALUES {placeholders}
+		ON DUPLICATE KEY UPDATE
+			`count` = VALUES(`count`), mean = VALUES(mean), m2 = VALUES(m2), ewma = VALUES(ewma),
+			last_rate = VALUES(last_rate), last_stock_entry = VALUES(last_stock_entry), modified = VALUES(modified)
+	""", [v for row in values for v in row])
+
+
+def get_consumption_stats(item_code):
+	"""
+	Running statistics of the item's materials:
+	[{material, count, share, mean, std_dev, ewma, last_rate}], share being the
+	fraction of the item's Manufacture entries that used the material.
+	"""
+	rows = frappe.db.sql(f"""
+		SELECT material, `count`, mean, m2, ewma, last_rate
+		FROM `{STATS_TABLE}`
+		WHERE item_code = %s
+		ORDER BY material
+	""", item_code, as_dict=1)
+
+	total = next((row.count for row in rows if row.material == ITEM_TOTAL), 0)
+
+	stats = []
+	for row in rows:
+		if row.material == ITEM_TOTAL or not row.count:
+			continue
+
+		stats.append(frappe._dict(
+			material=row.material,
+			count=row.count,
+			share=row.count / total if total else 0,
+			mean=row.mean,
+			std_dev=math.sqrt(row.m2 / (row.count - 1)) if row.count > 1 else 0,
+			ewma=row.ewma,
+			last_rate=row.last_rate,
+		))
+
+	return stats
+
+
+def propose_bom_items(item_code, basis="ewma", min_share=0.5):
+	"""
+	BOM materials for one unit of the item, from the running statistics.
+	basis is "ewma" (tracks recent changes) or "mean"; materials used in fewer than
+	min_share of the entries are left out. Rows match update_standard_bom's actual_items.
+	"""
+	if basis not in ("ewma", "mean"):
+		frappe.throw("Basis must be 'ewma' or 'mean'.")
+
+	return [
+		{"item_code": row.material, "qty_consumed": row[basis], "rate": row.last_rate}
+		for row in get_consumption_stats(item_code)
+		if row.share >= flt(min_share) and row[basis] > 0
+	]
+
+
+def rebuild_consumption_stats():
+	"""
+	One-off seeding from history, oldest first:
+	bench --site <site> execute vinfork_custom.bom_learning.rebuild_consumption_stats
+	"""
+	frappe.db.sql(f"DELETE FROM `{STATS_TABLE}`")
+
+	names = frappe.get_all("Stock Entry",
+		filters={"purpose": "Manufacture", "docstatus": 1, "work_order": ["is", "set"]},
+		order_by="posting_date asc, posting_time asc, creation asc",
+		pluck="name")
+
+	for name in names:
+		record_stock_entry(frappe.get_doc("Stock Entry", name))
+
+	frappe.db.commit()
@@ -0,0 +1,167 @@
+import copy
+import csv
+from collections import Counter
+from functools import lru_cache
+
+import frappe
+
+from vinfork_custom.instrumentation import instrument
+from vinfork_custom.operation_catalogue import get_operation_catalogue
+
+TEMPLATE_CACHE_KEY = "vinfork_bom_templates"
+DEFAULT_SOFA_TYPE = "Default"
+DUMMY_ITEM = "Test 1"
+
+# Custom BOM fields filled per BOM when they exist on this site
+OPTIONAL_FIELDS = ("custom_order_type", "custom_linked_sales_order")
+
+
+def get_sofa_type(item_code, item_name=None):
+	"""
+	Sofa type of an item, looked up in datasets/model_and_sofa_type.csv by the
+	longest model name the item code or item name starts with.
+	Falls back to DEFAULT_SOFA_TYPE for items that match no model.
+	"""
+	models = get_model_sofa_types()
+	for value in (item_code, item_name):
+		value = _normalize(value).upper()
+		if not value:
+			continue
+
+		for model in _models_longest_first():
+			if value == model or value.startswith(model + " ") or value.startswith(model + "-"):
+				return models[model]
+
+	return DEFAULT_SOFA_TYPE
+
+
+@lru_cache(maxsize=1)
+def get_model_sofa_types():
+	"""{MODEL NAME: Sofa Type} from the dataset shipped with the app"""
+	path = frappe.get_app_path("vinfork_custom", "datasets", "model_and_sofa_type.csv")
+	models = {}
+	spellings = {}
+	with open(path, newline="", encoding="utf-8-sig") as f:
+		for row in csv.DictReader(f):
+			model = _normalize(row.get("Model Name")).upper()
+			sofa_type = _normalize(row.get("Sofa Type"))
+			if model and sofa_type:
+				models[model] = sofa_type
+				spellings.setdefault(sofa_type.lower(), Counter())[sofa_type] += 1
+
+	# The sheet mixes "Static", "static" and "STATIC": use the most common spelling,
+	# so acronyms like "CT" keep their case
+	canonical = {key: counts.most_common(1)[0][0] for key, counts in spellings.items()}
+	return {model: canonical[sofa_type.lower()] for model, sofa_type in models.items()}
+
+
+@lru_cache(maxsize=1)
+def _models_longest_first():
+	return sorted(get_model_sofa_types(), key=len, reverse=True)
+
+
+def clone_bom_template(sofa_type, item_code, company, currency, order_type=None, sales_order=None):
+	"""
+	Returns a new, unsaved BOM for the item, cloned from the sofa type's template.
+	Only item, company, currency and the optional metadata fields are filled in.
+	"""
+	template = get_bom_template(sofa_type or DEFAULT_SOFA_TYPE)
+
+	bom = frappe.get_doc(copy.deepcopy(template["doc"]))
+	bom.item = item_code
+	bom.company = company
+	bom.currency = currency or "INR"
+
+	if "custom_order_type" in template["optional_fields"]:
+		bom.custom_order_type = order_type or "Standard"
+	if "custom_linked_sales_order" in template["optional_fields"]:
+		bom.custom_linked_sales_order = sales_order
+
+	return bom
+
+
+def get_bom_template(sofa_type):
+	"""The cached, validated BOM skeleton for a sofa type"""
+	return frappe.cache.hget(TEMPLATE_CACHE_KEY, sofa_type, generator=lambda: _build_template(sofa_type))
+
+
+@instrument
+def clear_bom_templates(doc=None, method=None, *args):
+	"""doc_events hook for Operation and Workstation: templates embed operations and their workstations"""
+	frappe.cache.delete_value(TEMPLATE_CACHE_KEY)
+	# Again once the change is visible to other connections, or a concurrent
+	# Auto-BOM could rebuild the templates from the old rows in the meantime
+	frappe.db.after_commit.add(lambda: frappe.cache.delete_value(TEMPLATE_CACHE_KEY))
+
+
+def clear_bom_templates_for_item(doc, method=None, old=None, *args):
+	"""doc_events hook for Item: templates embed the dummy raw material"""
+	if DUMMY_ITEM in (doc.name, old):
+		clear_bom_templates()
+
+
+def _build_template(sofa_type):
+	operations = get_operation_catalogue()
+	if not operations:
+		frappe.log_error("Auto-BOM: No Operations found. Creating BOM without operations.", "Auto BOM Warning")
+
+	_validate_workstations(operations)
+	_ensure_dummy_item()
+
+	doc = {
+		"doctype": "BOM",
+		"quantity": 1,
+		"is_default": 1,
+		"is_active": 1,
+		"with_operations": 1,  # Force the checkbox to be checked
+		"operations": [
+			{
+				"operation": op.name,
+				"workstation": op.workstation,  # CRITICAL: Explicitly set the workstation
+				"time_in_mins": 60,
+			}
+			for op in operations
+		],
+		# Dummy raw material, assume 0 cost
+		"items": [{"item_code": DUMMY_ITEM, "qty": 1, "rate": 0}],
+	}
+
+	return {
+		"sofa_type": sofa_type,
+		"doc": doc,
+		"optional_fields": [f for f in OPTIONAL_FIELDS if frappe.db.has_column("BOM", f)],
+	}
+
+
+def _validate_workstations(operations):
+	workstations = {op.workstation for op in operations if op.workstation}
+	if not workstations:
+		return
+
+	existing = set(frappe.get_all("Workstation", filters={"name": ["in", list(workstations)]}, pluck="name"))
+	missing = workstations - existing
+	if missing:
+		frappe.throw(f"Auto-BOM Failed: Default workstation(s) {', '.join(sorted(missing))} do not exist.")
+
+
+def _ensure_dummy_item():
+	if frappe.db.exists("Item", DUMMY_ITEM):
+		return
+
+	# Auto-create the dummy item if it doesn't exist
+	di = frappe.new_doc("Item")
+	di.item_code = DUMMY_ITEM
+	di.item_group = "Raw Material"
+	di.stock_uom = "Nos"
+	di.is_stock_item = 1
+	di.valuation_rate = 0
+	di.description = "Placeholder item for Auto-BOM"
+	di.save(ignore_permissions=True)
+	frappe.msgprint(f"⚠️ Created missing dummy item: {DUMMY_ITEM}")
+
+	# A cached template must not point at an item that was rolled back
+	frappe.db.after_rollback.add(clear_bom_templates)
+
+
+def _normalize(value):
+	return " ".join((value or "").split())
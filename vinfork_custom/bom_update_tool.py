@@ -1,6 +1,13 @@
 import frappe
+from frappe.utils import cint, flt
+
+from vinfork_custom.bom_hash import find_matching_bom, get_bom_content_hash, reuse_bom
+from vinfork_custom.instrumentation import instrument
+
+VARIANT_ORDER_TYPES = ("customization", "customisation", "npd", "new product")
 
 @frappe.whitelist()
+@instrument
 def update_bom_from_actuals(work_order_name):
     """
     Reads the 'Manufacture' Stock Entry for a given Work Order.
@@ -12,8 +19,11 @@ def update_bom_from_actuals(work_order_name):
     if not frappe.has_permission("BOM", "write"):
         frappe.throw("You do not have permission to edit BOMs.")
 
-    # 1. Get Work Order Details
-    wo = frappe.get_doc("Work Order", work_order_name)
+    # 1. Get Work Order Details (only the fields the tool needs)
+    wo = frappe.db.get_value("Work Order", work_order_name,
+                             ["name", "status", "bom_no", "qty", "sales_order", "production_item"], as_dict=1)
+    if not wo:
+        frappe.throw(f"Work Order {work_order_name} not found", frappe.DoesNotExistError)
     if wo.status not in ["Completed", "Closed"]:
         frappe.throw("Work Order must be Completed before updating BOM.")
 
@@ -24,35 +34,22 @@ def update_bom_from_actuals(work_order_name):
     # 2. Get Order Type from linked Sales Order
     order_type = get_order_type_from_work_order(wo)
     
-    # 3. Find the "Manufacture" Stock Entry
-    stock_entries = frappe.get_all("Stock Entry", 
-                                   filters={"work_order": work_order_name, "purpose": "Manufacture", "docstatus": 1},
-                                   fields=["name"])
-    
-    if not stock_entries:
+    # 3. Find the latest "Manufacture" Stock Entry
+    se_name = frappe.get_all("Stock Entry",
+                             filters={"work_order": work_order_name, "purpose": "Manufacture", "docstatus": 1},
+                             order_by="posting_date desc, posting_time desc, creation desc",
+                             limit=1, pluck="name")
+
+    if not se_name:
         frappe.throw("No 'Manufacture' Stock Entry found. Did you forget to consume materials?")
 
-    se_name = stock_entries[-1].name 
-    se = frappe.get_doc("Stock Entry", se_name)
+    se_items = frappe.get_all("Stock Entry Detail",
+                              filters={"parent": se_name[0], "parenttype": "Stock Entry"},
+                              fields=["item_code", "qty", "basic_rate", "is_finished_item", "is_scrap_item"],
+                              order_by="idx asc")
 
     # 4. Collect Actual Materials Used
-    actual_items = []
-    qty_produced = 0
-    
-    for item in se.items:
-        if item.is_finished_item:
-            qty_produced += item.qty
-        
-    if qty_produced == 0:
-        qty_produced = wo.qty
-
-    for item in se.items:
-        if not item.is_finished_item and not item.is_scrap_item:
-            actual_items.append({
-                "item_code": item.item_code,
-                "qty_consumed": item.qty,
-                "rate": item.basic_rate
-            })
+    actual_items, qty_produced = get_actual_items(se_items, wo.qty)
 
     if not actual_items:
         frappe.throw("No raw materials found in the Stock Entry.")
@@ -68,7 +65,7 @@ def update_bom_from_actuals(work_order_name):
         new_bom_name = update_standard_bom(old_bom, actual_items, qty_produced)
         frappe.msgprint(f"✅ Updated Standard BOM: {new_bom_name}")
         
-    elif order_type_lower in ["customization", "customisation", "npd", "new product"]:
+    elif order_type_lower in VARIANT_ORDER_TYPES:
         # Create NEW BOM variant (handle multiple naming variations)
         new_bom_name = create_bom_variant(old_bom, actual_items, qty_produced, order_type, wo)
         frappe.msgprint(f"✅ Created New {order_type} BOM: {new_bom_name}")
@@ -81,24 +78,84 @@ def update_bom_from_actuals(work_order_name):
     return new_bom_name
 
 
+@frappe.whitelist()
+@instrument
+def propose_bom_from_stats(item_code, basis="ewma", min_share=0.5):
+    """
+    Proposed per-unit materials for the item from the running consumption statistics.
+    Nothing is saved; no past Stock Entry is read.
+    """
+    from vinfork_custom.bom_learning import propose_bom_items
+
+    return propose_bom_items(item_code, basis=basis, min_share=flt(min_share))
+
+
+@frappe.whitelist()
+@instrument
+def update_bom_from_stats(item_code, basis="ewma", min_share=0.5):
+    """Re-baseline the item's default BOM from the running consumption statistics"""
+    if not frappe.has_permission("BOM", "write"):
+        frappe.throw("You do not have permission to edit BOMs.")
+
+    bom_name = frappe.db.get_value("Item", item_code, "default_bom")
+    if not bom_name:
+        frappe.throw(f"Item {item_code} has no default BOM.")
+
+    actual_items = propose_bom_from_stats(item_code, basis=basis, min_share=min_share)
+    if not actual_items:
+        frappe.throw(f"No consumption statistics recorded for {item_code} yet.")
+
+    # Proposed quantities are already per unit
+    new_bom_name = update_standard_bom(frappe.get_doc("BOM", bom_name), actual_items, 1)
+    frappe.msgprint(f"✅ Updated Standard BOM from statistics: {new_bom_name}")
+
+    return new_bom_name
+
+
+def get_actual_items(se_items, wo_qty):
+    """
+    Split Stock Entry rows into consumed materials and finished quantity.
+    Returns (actual_items, qty_produced); qty_produced falls back to the Work Order qty.
+    """
+    actual_items = []
+    qty_produced = 0
+
+    for item in se_items:
+        if item.is_finished_item:
+            qty_produced += item.qty
+
+    if qty_produced == 0:
+        qty_produced = wo_qty
+
+    for item in se_items:
+        if not item.is_finished_item and not item.is_scrap_item:
+            actual_items.append({
+                "item_code": item.item_code,
+                "qty_consumed": item.qty,
+                "rate": item.basic_rate
+            })
+
+    return actual_items, qty_produced
+
+
 def get_order_type_from_work_order(wo):
     """Get order type from linked Sales Order"""
     try:
-        if wo.sales_order:
-            # Get Sales Order
-            so = frappe.get_doc("Sales Order", wo.sales_order)
-            
-            # Find matching item in SO
-            for item in so.items:
-                if item.item_code == wo.production_item:
-                    return item.get("custom_order_type") or "Standard"
-        
+        if wo.sales_order and frappe.db.has_column("Sales Order Item", "custom_order_type"):
+            # Find matching item in SO, reading only the one field we need
+            so_item = frappe.db.get_value("Sales Order Item",
+                                          {"parent": wo.sales_order, "parenttype": "Sales Order",
+                                           "item_code": wo.production_item},
+                                          ["name", "custom_order_type"], as_dict=1, order_by="idx asc")
+            if so_item:
+                return so_item.custom_order_type or "Standard"
+
         # Check BOM custom field if exists
-        if wo.bom_no:
-            bom = frappe.get_doc("BOM", wo.bom_no)
-            if hasattr(bom, "custom_order_type") and bom.custom_order_type:
-                return bom.custom_order_type
-                
+        if wo.bom_no and frappe.db.has_column("BOM", "custom_order_type"):
+            order_type = frappe.db.get_value("BOM", wo.bom_no, "custom_order_type")
+            if order_type:
+                return order_type
+
     except Exception as e:
         frappe.log_error(f"Error getting order type: {str(e)}", "BOM Update Tool")
     
@@ -126,7 +183,12 @@ def update_standard_bom(old_bom, actual_items, qty_produced):
         new_row.qty = per_unit_qty
         new_row.rate = row["rate"]
         new_row.stock_qty = per_unit_qty 
-    
+
+    # Same materials as an existing Standard BOM (within rounding): reuse it instead of a new version
+    match = find_matching_bom(new_bom.item, get_bom_content_hash(new_bom), "Standard")
+    if match:
+        return reuse_bom(match, make_default=True)
+
     new_bom.save(ignore_permissions=True)
     new_bom.submit()
     
@@ -173,7 +235,12 @@ def create_bom_variant(old_bom, actual_items, qty_produced, order_type, wo):
         new_row.qty = per_unit_qty
         new_row.rate = row["rate"]
         new_row.stock_qty = per_unit_qty 
-    
+
+    # Same materials as this order's existing variant (within rounding): reuse it instead of a new one
+    match = find_matching_bom(new_bom.item, get_bom_content_hash(new_bom), order_type, wo.sales_order)
+    if match:
+        return reuse_bom(match, make_default=order_type == "NPD")
+
     new_bom.save(ignore_permissions=True)
     new_bom.submit()
     
@@ -183,3 +250,203 @@ def create_bom_variant(old_bom, actual_items, qty_produced, order_type, wo):
         frappe.db.set_value("BOM", old_bom.name, "is_default", 0)
         
     return new_bom.name
+
+
+# Bulk re-baseline
+# ----------------
+
+BULK_ENQUEUE_THRESHOLD = 50  # Work Orders; bigger batches run as a background job
+
+
+@frappe.whitelist()
+@instrument
+def update_boms_from_actuals(work_orders=None, filters=None, run_in_background=None):
+    """
+    Bulk version of update_bom_from_actuals for Standard products.
+    Takes a list of Work Order names or Work Order filters and emits at most
+    one new BOM version per item, pooling the actuals of all its Work Orders.
+    Large batches are queued; progress is published while items are processed.
+    """
+    if not frappe.has_permission("BOM", "write"):
+        frappe.throw("You do not have permission to edit BOMs.")
+
+    work_orders = frappe.parse_json(work_orders) if work_orders else None
+    filters = frappe.parse_json(filters) if filters else None
+    if not work_orders and not filters:
+        frappe.throw("Pass a list of Work Orders or Work Order filters.")
+
+    if run_in_background is None:
+        run_in_background = not work_orders or len(work_orders) > BULK_ENQUEUE_THRESHOLD
+
+    if cint(run_in_background):
+        frappe.enqueue(
+            "vinfork_custom.bom_update_tool.rebaseline_boms",
+            queue="long",
+            timeout=60 * 60,
+            work_orders=work_orders,
+            filters=filters,
+            notify_user=frappe.session.user,
+        )
+        frappe.msgprint("BOM re-baseline queued. You will be notified when it finishes.")
+        return {"queued": True}
+
+    return rebaseline_boms(work_orders=work_orders, filters=filters)
+
+
+def rebaseline_boms(work_orders=None, filters=None, notify_user=None):
+    """
+    Re-baselines the Standard BOMs of the given Work Orders.
+    Work Orders are grouped by item; the latest Manufacture Stock Entry of every
+    Work Order is read in a single query and the per-unit consumption is pooled
+    over the group. Returns a report with the updated and skipped entries.
+    """
+    report = {"updated": [], "skipped": [], "failed": []}
+
+    wos = _get_completed_work_orders(work_orders, filters)
+    if work_orders:
+        found = {wo.name for wo in wos}
+        for name in work_orders:
+            if name not in found:
+                report["skipped"].append({"work_order": name, "reason": "Not a completed Work Order"})
+
+    # Only Standard orders re-baseline the item's BOM; Customization/NPD get variants per order
+    order_types = _get_order_types(wos)
+    groups = {}
+    for wo in wos:
+        order_type = (order_types.get((wo.sales_order, wo.production_item)) or "Standard").lower()
+        if not wo.bom_no:
+            report["skipped"].append({"work_order": wo.name, "reason": "No BOM linked"})
+        elif order_type in VARIANT_ORDER_TYPES:
+            report["skipped"].append({"work_order": wo.name, "reason": f"Order type {order_type}"})
+        else:
+            groups.setdefault(wo.production_item, []).append(wo)
+
+    se_rows = _get_latest_manufacture_rows([wo.name for group in groups.values() for wo in group])
+
+    for idx, (item_code, group) in enumerate(groups.items()):
+        frappe.publish_progress(idx * 100 / len(groups), title="Re-baselining BOMs", description=item_code)
+
+        actual_items, qty_produced, used = _pool_actuals(group, se_rows)
+        for wo in group:
+            if wo.name not in used:
+                report["skipped"].append({"work_order": wo.name, "reason": "No Manufacture Stock Entry"})
+        if not actual_items:
+            continue
+
+        # The group's latest Work Order decides which BOM is re-baselined
+        old_bom_name = group[-1].bom_no
+        frappe.db.savepoint("bom_rebaseline")
+        try:
+            new_bom_name = update_standard_bom(frappe.get_doc("BOM", old_bom_name), actual_items, qty_produced)
+        except Exception as e:
+            frappe.db.rollback(save_point="bom_rebaseline")
+            frappe.log_error(f"Bulk BOM update failed for {item_code}: {e}", "BOM Update Tool")
+            report["failed"].append({"item_code": item_code, "error": str(e)})
+            continue
+
+        report["updated"].append({
+            "item_code": item_code,
+            "old_bom": old_bom_name,
+            "new_bom": new_bom_name,
+            "work_orders": sorted(used),
+        })
+
+    frappe.publish_progress(100, title="Re-baselining BOMs")
+
+    if notify_user:
+        frappe.publish_realtime("msgprint",
+                                f"✅ BOM re-baseline finished: {len(report['updated'])} updated, "
+                                f"{len(report['skipped'])} skipped, {len(report['failed'])} failed.",
+                                user=notify_user)
+
+    return report
+
+
+def _get_completed_work_orders(work_orders=None, filters=None):
+    """Takes filters as a dict or as the list of [field, operator, value] the desk sends"""
+    if isinstance(filters, dict):
+        conditions = [
+            [field, *value] if isinstance(value, list | tuple) else [field, "=", value]
+            for field, value in filters.items()
+        ]
+    else:
+        conditions = [list(f) for f in filters or ()]
+
+    conditions += [["docstatus", "=", 1], ["status", "in", ["Completed", "Closed"]]]
+    if work_orders:
+        conditions.append(["name", "in", work_orders])
+
+    return frappe.get_all("Work Order", filters=conditions,
+                          fields=["name", "production_item", "bom_no", "qty", "sales_order"],
+                          order_by="actual_end_date asc, name asc")
+
+
+def _get_order_types(wos):
+    """{(sales_order, item_code): custom_order_type} for the Work Orders' Sales Order lines"""
+    sales_orders = list({wo.sales_order for wo in wos if wo.sales_order})
+    if not sales_orders or not frappe.db.has_column("Sales Order Item", "custom_order_type"):
+        return {}
+
+    rows = frappe.get_all("Sales Order Item", filters={"parent": ["in", sales_orders]},
+                          fields=["parent", "item_code", "custom_order_type"])
+    order_types = {}
+    for row in rows:
+        order_types.setdefault((row.parent, row.item_code), row.custom_order_type)
+
+    return order_types
+
+
+def _get_latest_manufacture_rows(wo_names):
+    """Rows of the latest submitted Manufacture Stock Entry per Work Order, {work_order: [rows]}"""
+    if not wo_names:
+        return {}
+
+    rows = frappe.db.sql("""
+        SELECT se.work_order, se.name AS stock_entry, sed.item_code, sed.qty, sed.basic_rate,
+            sed.is_finished_item, sed.is_scrap_item
+        FROM `tabStock Entry` se
+        INNER JOIN `tabStock Entry Detail` sed ON sed.parent = se.name
+        WHERE se.work_order IN %(work_orders)s
+            AND se.purpose = 'Manufacture'
+            AND se.docstatus = 1
+        ORDER BY se.posting_date, se.posting_time, se.creation, sed.idx
+    """, {"work_orders": wo_names}, as_dict=1)
+
+    # Keep only the last entry of each Work Order, like the single Work Order tool
+    latest = {}
+    for row in rows:
+        latest[row.work_order] = row.stock_entry
+
+    se_rows = {}
+    for row in rows:
+        if latest[row.work_order] == row.stock_entry:
+            se_rows.setdefault(row.work_order, []).append(row)
+
+    return se_rows
+
+
+def _pool_actuals(group, se_rows):
+    """
+    Per-unit actuals over all Work Orders of one item.
+    Returns (actual_items, qty_produced, used_work_orders); the latest rate wins.
+    """
+    consumed = {}
+    qty_produced = 0
+    used = set()
+
+    for wo in group:
+        if wo.name not in se_rows:
+            continue
+
+        items, produced = get_actual_items(se_rows[wo.name], wo.qty)
+        if not produced:
+            continue
+
+        used.add(wo.name)
+        qty_produced += produced
+        for row in items:
+            entry = consumed.setdefault(row["item_code"], {"item_code": row["item_code"], "qty_consumed": 0})
+            entry["qty_consumed"] += row["qty_consumed"]
+            entry["rate"] = row["rate"]
+
+    return list(consumed.values()), qty_produced, used
@@ -6,9 +6,12 @@
 import frappe
 from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
 
+from vinfork_custom.instrumentation import instrument
+
 def execute():
     """
-    Create custom fields in BOM DocType to store order type and sales order reference
+    Create custom fields in BOM DocType to store order type, sales order reference
+    and the content hash
     Run this once via bench console or as API endpoint
     """
     
@@ -31,6 +34,17 @@ def execute():
                 "insert_after": "custom_order_type",
                 "read_only": 1,
                 "description": "Original Sales Order that created this BOM"
+            },
+            {
+                "fieldname": "custom_content_hash",
+                "label": "Content Hash",
+                "fieldtype": "Data",
+                "insert_after": "custom_linked_sales_order",
+                "read_only": 1,
+                "hidden": 1,
+                "no_copy": 1,
+                "search_index": 1,
+                "description": "Hash of the materials and per-unit quantities, used to skip duplicate BOMs"
             }
         ]
     }
@@ -49,5 +63,6 @@ def execute():
 
 # Method 2: Make it whitelisted and call via API
 @frappe.whitelist()
+@instrument
 def create_fields():
     return execute()
@@ -85,7 +85,7 @@ doctype_js = {
 # ------------
 
 # before_install = "vinfork_custom.install.before_install"
-# after_install = "vinfork_custom.install.after_install"
+after_install = "vinfork_custom.install.after_install"
 
 # Uninstallation
 # ------------
@@ -142,29 +142,81 @@ doctype_js = {
 doc_events = {
     "Sales Order": {
         "on_submit": "vinfork_custom.auto_bom.create_bom_on_submit"
+    },
+    "BOM": {
+        "validate": "vinfork_custom.bom_hash.set_content_hash"
+    },
+    "Stock Entry": {
+        "on_submit": [
+            "vinfork_custom.bom_learning.record_stock_entry",
+            "vinfork_custom.production_status_snapshot.on_stock_entry_change"
+        ],
+        "on_cancel": [
+            "vinfork_custom.bom_learning.reverse_stock_entry",
+            "vinfork_custom.production_status_snapshot.on_stock_entry_change"
+        ]
+    },
+    "Work Order": {
+        "on_change": [
+            "vinfork_custom.production_status_snapshot.on_work_order_change",
+            "vinfork_custom.production_status_cache.invalidate_report_cache"
+        ],
+        "after_delete": [
+            "vinfork_custom.production_status_snapshot.on_work_order_change",
+            "vinfork_custom.production_status_cache.invalidate_report_cache"
+        ]
+    },
+    "Job Card": {
+        "on_change": [
+            "vinfork_custom.production_status_snapshot.on_job_card_change",
+            "vinfork_custom.production_status_cache.invalidate_report_cache"
+        ],
+        "after_delete": [
+            "vinfork_custom.production_status_snapshot.on_job_card_change",
+            "vinfork_custom.production_status_cache.invalidate_report_cache"
+        ]
+    },
+    "Operation": {
+        "on_update": [
+            "vinfork_custom.operation_catalogue.clear_operation_catalogue",
+            "vinfork_custom.bom_templates.clear_bom_templates",
+            "vinfork_custom.production_status_snapshot.on_operation_change",
+            "vinfork_custom.production_status_cache.invalidate_report_cache"
+        ],
+        "after_rename": [
+            "vinfork_custom.operation_catalogue.clear_operation_catalogue",
+            "vinfork_custom.bom_templates.clear_bom_templates",
+            "vinfork_custom.production_status_snapshot.on_operation_change",
+            "vinfork_custom.production_status_cache.invalidate_report_cache"
+        ],
+        "on_trash": [
+            "vinfork_custom.operation_catalogue.clear_operation_catalogue",
+            "vinfork_custom.bom_templates.clear_bom_templates",
+            "vinfork_custom.production_status_snapshot.on_operation_change",
+            "vinfork_custom.production_status_cache.invalidate_report_cache"
+        ]
+    },
+    "Workstation": {
+        "after_rename": "vinfork_custom.bom_templates.clear_bom_templates",
+        "on_trash": "vinfork_custom.bom_templates.clear_bom_templates"
+    },
+    "Item": {
+        "after_rename": "vinfork_custom.bom_templates.clear_bom_templates_for_item",
+        "on_trash": "vinfork_custom.bom_templates.clear_bom_templates_for_item"
     }
 }
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"vinfork_custom.tasks.all"
-# 	],
-# 	"daily": [
-# 		"vinfork_custom.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"vinfork_custom.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"vinfork_custom.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"vinfork_custom.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+    "all": [
+        "vinfork_custom.auto_bom.enqueue_due_retries"
+    ],
+    "daily_long": [
+        "vinfork_custom.tasks.rebaseline_completed_work_orders"
+    ]
+}
 
 # Testing
 # -------
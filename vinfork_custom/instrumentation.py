@@ -0,0 +1,205 @@
+import functools
+import inspect
+import json
+import time
+
+import frappe
+from frappe.model.document import Document
+
+# Per-call metrics of the app's hooks, whitelisted methods and report, kept in redis:
+# a capped list of recent calls per entry point and a capped slow-call log.
+# Recording is one pipelined round trip per call; "vinfork_instrumentation": 0
+# in site_config.json turns it off.
+METRICS_PREFIX = "vinfork_metrics"
+SAMPLES_PER_ENTRY_POINT = 1000
+SLOW_CALLS = 200
+
+# Calls slower than this are logged with their arguments ("vinfork_slow_call_ms" in site_config.json)
+DEFAULT_SLOW_CALL_MS = 1000
+
+
+def instrument(fn):
+	"""
+	Records queries, DB time, wall time and rows returned for every call of fn.
+	Goes under @frappe.whitelist(), so the whitelisted object is the instrumented one.
+	"""
+	entry_point = f"{fn.__module__}.{fn.__qualname__}"
+
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		if not frappe.conf.get("vinfork_instrumentation", 1) or not getattr(frappe.local, "db", None):
+			return fn(*args, **kwargs)
+
+		counter = count_queries()
+		result, error = None, None
+		start = time.perf_counter()
+		try:
+			with counter:
+				result = fn(*args, **kwargs)
+		except Exception as e:
+			# Failed calls (timeouts, lock waits, validation errors) are recorded too
+			error = type(e).__name__
+			raise
+		finally:
+			wall_ms = (time.perf_counter() - start) * 1000
+			_record(entry_point, wall_ms, counter, _count_rows(result), args, kwargs, error)
+
+		return result
+
+	# frappe matches request arguments against the signature of the whitelisted function
+	wrapper.__signature__ = inspect.signature(fn)
+	return wrapper
+
+
+class count_queries:
+	"""
+	Counts frappe.db.sql calls and the time spent in them while the block runs.
+	Nested blocks share one patched frappe.db.sql and each sees only its own queries.
+	"""
+
+	def __enter__(self):
+		state = getattr(frappe.local, "vinfork_query_counter", None)
+		if state is None:
+			state = frappe.local.vinfork_query_counter = {"depth": 0, "queries": 0, "db_ms": 0.0}
+
+		if not state["depth"]:
+			_patch_sql(state)
+
+		state["depth"] += 1
+		self.state = state
+		self.start = (state["queries"], state["db_ms"])
+		self.queries, self.db_ms = 0, 0.0
+		return self
+
+	def __exit__(self, *exc):
+		state = self.state
+		self.queries = state["queries"] - self.start[0]
+		self.db_ms = state["db_ms"] - self.start[1]
+
+		state["depth"] -= 1
+		if not state["depth"]:
+			vars(frappe.local.db).pop("sql", None)
+			state["queries"], state["db_ms"] = 0, 0.0
+
+
+def _patch_sql(state):
+	db = frappe.local.db
+	sql = db.sql
+
+	def counting_sql(*args, **kwargs):
+		state["queries"] += 1
+		start = time.perf_counter()
+		try:
+			return sql(*args, **kwargs)
+		finally:
+			state["db_ms"] += (time.perf_counter() - start) * 1000
+
+	# Instance attribute, so removing it restores the class method
+	db.sql = counting_sql
+
+
+def _count_rows(result):
+	if isinstance(result, tuple) and len(result) >= 2 and isinstance(result[1], list):
+		# Report execute: (columns, data, ...)
+		return len(result[1])
+	if isinstance(result, dict) and isinstance(result.get("rows"), list):
+		return len(result["rows"])
+	if isinstance(result, (list, tuple)):
+		return len(result)
+	return 0
+
+
+def _record(entry_point, wall_ms, counter, rows, args, kwargs, error=None):
+	sample = {
+		"ts": round(time.time(), 3),
+		"wall_ms": round(wall_ms, 2),
+		"db_ms": round(counter.db_ms, 2),
+		"queries": counter.queries,
+		"rows": rows,
+	}
+	if error:
+		sample["error"] = error
+
+	try:
+		pipe = frappe.cache.pipeline()
+		pipe.sadd(_key("entry_points"), entry_point)
+		pipe.lpush(_key(f"calls:{entry_point}"), json.dumps(sample))
+		pipe.ltrim(_key(f"calls:{entry_point}"), 0, SAMPLES_PER_ENTRY_POINT - 1)
+
+		# Failed calls go to the slow-call log whatever their duration, with their arguments
+		if error or wall_ms >= frappe.conf.get("vinfork_slow_call_ms", DEFAULT_SLOW_CALL_MS):
+			slow = dict(sample, entry_point=entry_point, user=frappe.session.user if frappe.session else None,
+				args=[_describe(arg) for arg in args], kwargs={k: _describe(v) for k, v in kwargs.items()})
+			pipe.lpush(_key("slow_calls"), json.dumps(slow, default=str))
+			pipe.ltrim(_key("slow_calls"), 0, SLOW_CALLS - 1)
+
+		pipe.execute()
+	except Exception:
+		# Metrics must never fail the call they measure
+		pass
+
+
+def _describe(value):
+	"""Arguments as short strings; documents are named, not dumped"""
+	if isinstance(value, Document):
+		return f"{value.doctype} {value.name}"
+
+	text = repr(value)
+	return text if len(text) <= 200 else text[:197] + "..."
+
+
+@frappe.whitelist()
+def get_metrics_summary(entry_point=None):
+	"""p50/p95/p99 of wall time, DB time and queries per entry point, over the recent calls, failed ones too"""
+	frappe.only_for("System Manager")
+
+	entry_points = [entry_point] if entry_point else sorted(
+		frappe.safe_decode(name) for name in frappe.cache.smembers(_name("entry_points"))
+	)
+
+	summary = []
+	for name in entry_points:
+		samples = [json.loads(s) for s in frappe.cache.lrange(_name(f"calls:{name}"), 0, -1)]
+		if not samples:
+			continue
+
+		row = {"entry_point": name, "calls": len(samples), "errors": sum(1 for s in samples if s.get("error"))}
+		for metric in ("wall_ms", "db_ms", "queries", "rows"):
+			values = sorted(s[metric] for s in samples)
+			for p in (50, 95, 99):
+				row[f"{metric}_p{p}"] = _percentile(values, p)
+		summary.append(row)
+
+	summary.sort(key=lambda row: row["wall_ms_p95"], reverse=True)
+	return summary
+
+
+@frappe.whitelist()
+def get_slow_calls(limit=50):
+	"""Most recent calls over the slow-call threshold or failed, with their arguments"""
+	frappe.only_for("System Manager")
+
+	return [json.loads(s) for s in frappe.cache.lrange(_name("slow_calls"), 0, int(limit) - 1)]
+
+
+@frappe.whitelist()
+def clear_metrics():
+	frappe.only_for("System Manager")
+
+	names = [frappe.safe_decode(name) for name in frappe.cache.smembers(_name("entry_points"))]
+	frappe.cache.delete(*[_key(f"calls:{name}") for name in names], _key("slow_calls"), _key("entry_points"))
+
+
+def _percentile(values, p):
+	"""Nearest-rank percentile of sorted values"""
+	index = max(0, -(-len(values) * p // 100) - 1)
+	return values[min(index, len(values) - 1)]
+
+
+def _name(key):
+	return f"{METRICS_PREFIX}:{key}"
+
+
+def _key(key):
+	# Pipelines and delete are raw redis commands, so the site prefix is added explicitly
+	return frappe.cache.make_key(_name(key))
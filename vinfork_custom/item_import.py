@@ -0,0 +1,235 @@
+import csv
+
+import frappe
+from frappe.utils import cint, now
+
+from vinfork_custom.instrumentation import instrument
+
+# Raw-material master shipped with the app: Item Name, UOM, Item group
+ITEMS_FILE = ("vinfork_custom", "datasets", "items.csv")
+BATCH_SIZE = 200
+CHECKPOINT_KEY = "vinfork_item_import_checkpoint"
+
+
+@frappe.whitelist()
+@instrument
+def import_items(resume=1):
+	"""
+	Queues the import of the item master shipped with the app (datasets/items.csv).
+	With resume, an interrupted import continues after the last committed batch.
+	"""
+	if not frappe.has_permission("Item", "create"):
+		frappe.throw("You do not have permission to create Items.")
+
+	frappe.enqueue(
+		"vinfork_custom.item_import.run_import",
+		queue="long",
+		timeout=60 * 60,
+		job_id="item_import",
+		deduplicate=True,
+		resume=cint(resume),
+		notify_user=frappe.session.user,
+	)
+	frappe.msgprint("Item import queued. You will be notified when it finishes.")
+
+
+def run_import(resume=True, notify_user=None):
+	"""
+	Diffs the file against existing Items by item name and applies the difference:
+	new rows go in with bulk inserts, changed rows are updated in batches.
+	UOMs and Item Groups are validated for the whole file in one pass; invalid rows
+	are reported with their line number and skipped. Every batch commits and
+	moves the checkpoint, so a rerun with resume skips finished batches.
+	"""
+	file_path = frappe.get_app_path(*ITEMS_FILE)
+	rows = read_item_rows(file_path)
+
+	report = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": []}
+	rows = _validate_rows(rows, report["errors"])
+
+	checkpoint = _get_checkpoint(file_path) if resume else 0
+	existing = _get_existing_items()
+	with_stock = _get_items_with_stock([existing[row.key].name for row in rows if row.key in existing])
+
+	pending = [row for row in rows if row.line > checkpoint]
+	for start in range(0, len(pending), BATCH_SIZE):
+		batch = pending[start : start + BATCH_SIZE]
+
+		new, changed = [], []
+		for row in batch:
+			item = existing.get(row.key)
+			if not item:
+				new.append(row)
+			elif (item.stock_uom, item.item_group) != (row.uom, row.item_group):
+				if item.stock_uom != row.uom and item.name in with_stock:
+					report["errors"].append(_error(row, "Stock UOM cannot be changed after stock transactions"))
+					row.uom = item.stock_uom
+					if item.item_group == row.item_group:
+						continue
+				changed.append((item, row))
+			else:
+				report["unchanged"] += 1
+
+		_insert_items(new)
+		_update_items(changed)
+
+		report["inserted"] += len(new)
+		report["updated"] += len(changed)
+		_set_checkpoint(file_path, batch[-1].line)
+		frappe.db.commit()
+
+	_set_checkpoint(file_path, 0)
+	frappe.db.commit()
+
+	if report["errors"]:
+		frappe.log_error(
+			"\n".join(f"Line {e['line']} ({e['item_name']}): {e['error']}" for e in report["errors"]),
+			"Item Import Errors",
+		)
+
+	if notify_user:
+		frappe.publish_realtime("msgprint",
+			f"Item import finished: {report['inserted']} inserted, {report['updated']} updated, "
+			f"{report['unchanged']} unchanged, {len(report['errors'])} errors (see Error Log).",
+			user=notify_user)
+
+	return report
+
+
+def read_item_rows(file_path):
+	"""Rows of the item file with their line number"""
+	rows = []
+	with open(file_path, newline="", encoding="utf-8-sig") as f:
+		for line, row in enumerate(csv.DictReader(f), start=2):
+			item_name = " ".join((row.get("Item Name") or "").split())
+			rows.append(frappe._dict(
+				line=line,
+				item_name=item_name,
+				key=item_name.lower(),
+				uom=(row.get("UOM") or "").strip(),
+				item_group=(row.get("Item group") or "").strip(),
+			))
+
+	return rows
+
+
+def _validate_rows(rows, errors):
+	"""Checks names, UOMs and Item Groups of all rows at once; returns the valid rows"""
+	uoms = {name.lower(): name for name in frappe.get_all("UOM", pluck="name")}
+	item_groups = {name.lower(): name for name in frappe.get_all("Item Group", filters={"is_group": 0}, pluck="name")}
+
+	valid = []
+	seen = set()
+	for row in rows:
+		if not row.item_name:
+			errors.append(_error(row, "Item Name is missing"))
+		elif row.key in seen:
+			errors.append(_error(row, "Duplicate Item Name in file"))
+		elif row.uom.lower() not in uoms:
+			errors.append(_error(row, f"UOM {row.uom} does not exist"))
+		elif row.item_group.lower() not in item_groups:
+			errors.append(_error(row, f"Item Group {row.item_group} does not exist"))
+		else:
+			# Use the names as spelled in the system
+			row.uom = uoms[row.uom.lower()]
+			row.item_group = item_groups[row.item_group.lower()]
+			valid.append(row)
+		seen.add(row.key)
+
+	return valid
+
+
+def _get_existing_items():
+	"""{lowercase item name or code: item}"""
+	existing = {}
+	for item in frappe.get_all("Item", fields=["name", "item_name", "stock_uom", "item_group"]):
+		existing.setdefault(item.name.lower(), item)
+		if item.item_name:
+			existing.setdefault(item.item_name.lower(), item)
+
+	return existing
+
+
+def _get_items_with_stock(item_codes):
+	if not item_codes:
+		return set()
+
+	return set(frappe.get_all("Stock Ledger Entry", filters={"item_code": ["in", item_codes]},
+		pluck="item_code", distinct=True))
+
+
+def _insert_items(rows):
+	if not rows:
+		return
+
+	timestamp = now()
+	user = frappe.session.user
+	common = (timestamp, timestamp, user, user, 0)
+
+	frappe.db.bulk_insert(
+		"Item",
+		["name", "item_code", "item_name", "description", "stock_uom", "item_group",
+			"is_stock_item", "include_item_in_manufacturing", "creation", "modified", "owner", "modified_by",
+			"docstatus"],
+		[(row.item_name, row.item_name, row.item_name, row.item_name, row.uom, row.item_group, 1, 1, *common)
+			for row in rows],
+	)
+	_insert_stock_uom_conversions([(row.item_name, row.uom) for row in rows])
+
+
+def _update_items(changes):
+	"""Applies the changes with one UPDATE per (stock_uom, item_group) combination"""
+	if not changes:
+		return
+
+	groups = {}
+	for item, row in changes:
+		groups.setdefault((row.uom, row.item_group), []).append(item.name)
+
+	timestamp = now()
+	for (uom, item_group), names in groups.items():
+		frappe.db.sql("""
+			UPDATE `tabItem`
+			SET stock_uom = %s, item_group = %s, modified = %s, modified_by = %s
+			WHERE name IN %s
+		""", (uom, item_group, timestamp, frappe.session.user, names))
+
+	_insert_stock_uom_conversions([(item.name, row.uom) for item, row in changes if item.stock_uom != row.uom])
+
+	for item, _ in changes:
+		frappe.clear_document_cache("Item", item.name)
+
+
+def _insert_stock_uom_conversions(item_uoms):
+	"""Adds the 1:1 UOM Conversion Detail row an Item needs for its stock UOM, if missing"""
+	if not item_uoms:
+		return
+
+	existing = {
+		(row.parent, row.uom)
+		for row in frappe.get_all("UOM Conversion Detail",
+			filters={"parenttype": "Item", "parent": ["in", [name for name, _ in item_uoms]]},
+			fields=["parent", "uom"])
+	}
+
+	timestamp = now()
+	user = frappe.session.user
+	frappe.db.bulk_insert(
+		"UOM Conversion Detail",
+		["name", "parent", "parenttype", "parentfield", "idx", "uom", "conversion_factor",
+			"creation", "modified", "owner", "modified_by", "docstatus"],
+		[(frappe.generate_hash(length=10), name, "Item", "uoms", 1, uom, 1, timestamp, timestamp, user, user, 0)
+			for name, uom in item_uoms if (name, uom) not in existing],
+	)
+
+
+def _get_checkpoint(file_path):
+	return cint(frappe.db.get_global(f"{CHECKPOINT_KEY}:{frappe.scrub(file_path)}"[:140]))
+
+
+def _set_checkpoint(file_path, line):
+	frappe.db.set_global(f"{CHECKPOINT_KEY}:{frappe.scrub(file_path)}"[:140], line)
+
+
+def _error(row, message):
+	return {"line": row.line, "item_name": row.item_name, "error": message}
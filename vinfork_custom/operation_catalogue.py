@@ -0,0 +1,39 @@
+import frappe
+
+from vinfork_custom.instrumentation import instrument
+
+CACHE_KEY = "vinfork_operation_catalogue"
+
+
+def get_operation_catalogue():
+	"""
+	Returns all Operations in report order (idx, name), each as
+	{name, workstation, idx, status_fieldname}.
+
+	The list is kept in the site cache and cleared whenever an Operation
+	is saved, renamed or deleted, so callers never query Operation directly.
+	"""
+	return frappe.cache.get_value(CACHE_KEY, generator=_build_catalogue)
+
+
+@instrument
+def clear_operation_catalogue(doc=None, method=None, *args):
+	"""doc_events hook for Operation: drop the cached catalogue"""
+	frappe.cache.delete_value(CACHE_KEY)
+	# Again once the change is visible to other connections, or a concurrent
+	# run could rebuild the catalogue from the old rows in the meantime
+	frappe.db.after_commit.add(lambda: frappe.cache.delete_value(CACHE_KEY))
+
+
+def _build_catalogue():
+	operations = frappe.get_all(
+		"Operation",
+		fields=["name", "workstation", "idx"],
+		order_by="idx asc, name asc",
+		ignore_permissions=True,
+	)
+
+	for op in operations:
+		op.status_fieldname = frappe.scrub(op.name) + "_status"  # e.g. "frame_making_status"
+
+	return operations
@@ -0,0 +1,67 @@
+import frappe
+
+# (doctype, index name, columns), matching the predicates of
+# - production_status_report.get_job_card_counts: work_order IN (...) AND docstatus != 2
+# - bom_update_tool: Stock Entry by work_order, purpose = 'Manufacture' AND docstatus = 1
+# - auto_bom._prefetch_item_state: BOM item IN (...) AND is_active = 1
+# - production_status_report.get_work_orders: docstatus = 1 ORDER BY planned_end_date, name
+COMPOSITE_INDEXES = (
+	("Job Card", "vinfork_work_order_docstatus", ("work_order", "docstatus")),
+	("Stock Entry", "vinfork_work_order_purpose_docstatus", ("work_order", "purpose", "docstatus")),
+	("BOM", "vinfork_item_is_active", ("item", "is_active")),
+	("Work Order", "vinfork_docstatus_planned_end_date", ("docstatus", "planned_end_date")),
+)
+
+SAMPLE_SIZE = 50
+
+
+def execute():
+	queries = get_explain_queries()
+	print_explain("Before", queries)
+
+	for doctype, index_name, columns in COMPOSITE_INDEXES:
+		frappe.db.add_index(doctype, list(columns), index_name)
+
+	print_explain("After", queries)
+
+
+def rollback():
+	"""Drops the indexes again: bench --site <site> execute vinfork_custom.patches.add_composite_indexes.rollback"""
+	for doctype, index_name, _ in COMPOSITE_INDEXES:
+		if frappe.db.has_index(f"tab{doctype}", index_name):
+			frappe.db.sql_ddl(f"ALTER TABLE `tab{doctype}` DROP INDEX `{index_name}`")
+
+
+def get_explain_queries():
+	"""The indexed queries with sample values from this site"""
+	work_orders = frappe.get_all("Work Order", order_by="creation desc", limit=SAMPLE_SIZE, pluck="name") or [""]
+	items = frappe.get_all("BOM", order_by="creation desc", limit=SAMPLE_SIZE, pluck="item") or [""]
+
+	return {
+		"Job Card": ("""
+			SELECT work_order, operation, COUNT(*) FROM `tabJob Card`
+			WHERE work_order IN %(work_orders)s AND docstatus != 2
+			GROUP BY work_order, operation
+		""", {"work_orders": work_orders}),
+		"Stock Entry": ("""
+			SELECT name FROM `tabStock Entry`
+			WHERE work_order IN %(work_orders)s AND purpose = 'Manufacture' AND docstatus = 1
+		""", {"work_orders": work_orders}),
+		"BOM": ("""
+			SELECT DISTINCT item FROM `tabBOM`
+			WHERE item IN %(items)s AND is_active = 1
+		""", {"items": items}),
+		"Work Order": ("""
+			SELECT name FROM `tabWork Order`
+			WHERE docstatus = 1
+			ORDER BY planned_end_date ASC, name ASC
+			LIMIT 100
+		""", {}),
+	}
+
+
+def print_explain(title, queries):
+	print(f"{title}:")
+	for doctype, (query, values) in queries.items():
+		for row in frappe.db.sql(f"EXPLAIN {query}", values, as_dict=True):
+			print(f"  {doctype}: type={row.type} key={row.key} rows={row.rows} {row.Extra or ''}".rstrip())
@@ -0,0 +1,28 @@
+import frappe
+
+from vinfork_custom.bom_hash import HASH_FIELD, get_bom_content_hash
+from vinfork_custom.create_bom_custom_fields import execute as create_bom_custom_fields
+
+BATCH_SIZE = 500
+
+
+def execute():
+	# The content hash field is newer than the original custom field patch
+	create_bom_custom_fields()
+
+	boms = frappe.get_all("BOM", filters={"docstatus": ["<", 2], HASH_FIELD: ["is", "not set"]},
+		fields=["name", "quantity"])
+
+	for start in range(0, len(boms), BATCH_SIZE):
+		batch = {bom.name: frappe._dict(quantity=bom.quantity, items=[]) for bom in boms[start : start + BATCH_SIZE]}
+
+		for row in frappe.get_all("BOM Item", filters={"parent": ["in", list(batch)], "parenttype": "BOM"},
+				fields=["parent", "item_code", "qty"]):
+			batch[row.parent]["items"].append(row)
+
+		cases = " ".join(["WHEN %s THEN %s"] * len(batch))
+		values = [v for name, bom in batch.items() for v in (name, get_bom_content_hash(bom))]
+		frappe.db.sql(f"""
+			UPDATE `tabBOM` SET `{HASH_FIELD}` = CASE name {cases} END
+			WHERE name IN %s
+		""", (*values, list(batch)))
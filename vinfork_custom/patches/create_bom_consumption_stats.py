@@ -0,0 +1,5 @@
+from vinfork_custom.bom_learning import create_stats_table
+
+
+def execute():
+	create_stats_table()
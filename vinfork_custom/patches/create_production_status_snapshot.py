@@ -0,0 +1,6 @@
+from vinfork_custom.production_status_snapshot import rebuild
+
+
+def execute():
+	# Creates the table and fills it in chunks
+	rebuild()
@@ -1,53 +1,19 @@
-
 import frappe
 
-def execute():
-	doctype = "Lead Sync Source"
+from vinfork_custom.patches.utils import remove_workspace_references
 
-	# 1. Clean up Workspaces that reference the missing DocType
-	if frappe.db.exists("Workspace"): # Only run if Workspace feature exists
-		workspaces = frappe.get_all("Workspace", pluck="name")
-		for w in workspaces:
-			try:
-				doc = frappe.get_doc("Workspace", w)
-				modified = False
-				
-				# Iterate over links
-				if hasattr(doc, "links"):
-					new_links = []
-					for link in doc.links:
-						if link.link_to == doctype:
-							modified = True
-						else:
-							new_links.append(link)
-					
-					if modified:
-						doc.links = new_links
-						doc.save()
-						frappe.db.commit()
+DOCTYPE = "Lead Sync Source"
 
-				# Iterate over shortcuts
-				if hasattr(doc, "shortcuts"):
-					new_shortcuts = []
-					for shortcut in doc.shortcuts:
-						if shortcut.link_to == doctype:
-							modified = True
-						else:
-							new_shortcuts.append(shortcut)
-					
-					if modified:
-						doc.shortcuts = new_shortcuts
-						doc.save()
-						frappe.db.commit()
-			except Exception:
-				# Log but don't crash
-				frappe.log_error(f"Failed to patch workspace {w}")
+
+def execute():
+	# 1. Clean up Workspaces that reference the missing DocType
+	remove_workspace_references(DOCTYPE)
 
 	# 2. ALSO Check if the DocType record itself exists but file is missing
 	# Often causing crashes if referenced by other things
-	if frappe.db.exists("DocType", doctype):
+	if frappe.db.exists("DocType", DOCTYPE):
 		try:
-			frappe.delete_doc("DocType", doctype, force=1)
+			frappe.delete_doc("DocType", DOCTYPE, force=1)
 		except Exception:
 			# If delete_doc fails, allow manual removal or ignore
 			pass
@@ -0,0 +1,70 @@
+import json
+
+import frappe
+from frappe.utils import now
+
+WORKSPACE_CHILD_TABLES = ("Workspace Link", "Workspace Shortcut")
+
+
+def remove_workspace_references(link_to):
+	"""
+	Deletes the Workspace Links and Shortcuts pointing at link_to (a name or a list of names),
+	e.g. a DocType or Report that no longer exists. One query per child table finds the rows,
+	they are deleted in bulk, shortcut blocks are dropped from the affected workspaces' content
+	and only those workspaces are touched. Commits once; returns the names of the changed workspaces.
+	"""
+	targets = [link_to] if isinstance(link_to, str) else list(link_to)
+	if not targets:
+		return set()
+
+	changed = set()
+	shortcut_labels = {}
+	for doctype in WORKSPACE_CHILD_TABLES:
+		if not frappe.db.table_exists(doctype):
+			continue
+
+		rows = frappe.get_all(doctype, filters={"parenttype": "Workspace", "link_to": ["in", targets]},
+			fields=["name", "parent", "label"])
+		if not rows:
+			continue
+
+		frappe.db.delete(doctype, {"name": ["in", [row.name for row in rows]]})
+		changed.update(row.parent for row in rows)
+
+		if doctype == "Workspace Shortcut":
+			for row in rows:
+				shortcut_labels.setdefault(row.parent, set()).add(row.label)
+
+	if not changed:
+		return changed
+
+	_remove_shortcut_blocks(shortcut_labels)
+	frappe.db.sql("""
+		UPDATE `tabWorkspace` SET modified = %s, modified_by = %s WHERE name IN %s
+	""", (now(), frappe.session.user, list(changed)))
+
+	frappe.db.commit()
+	frappe.clear_cache()
+
+	return changed
+
+
+def _remove_shortcut_blocks(shortcut_labels):
+	"""The workspace content lists shortcuts by label; drop blocks whose shortcut row is gone"""
+	if not shortcut_labels:
+		return
+
+	for name, content in frappe.get_all("Workspace", filters={"name": ["in", list(shortcut_labels)]},
+			fields=["name", "content"], as_list=True):
+		try:
+			blocks = json.loads(content or "[]")
+		except ValueError:
+			continue
+
+		labels = shortcut_labels[name]
+		kept = [
+			block for block in blocks
+			if not (block.get("type") == "shortcut" and block.get("data", {}).get("shortcut_name") in labels)
+		]
+		if len(kept) != len(blocks):
+			frappe.db.set_value("Workspace", name, "content", json.dumps(kept), update_modified=False)
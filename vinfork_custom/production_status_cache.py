@@ -0,0 +1,98 @@
+import hashlib
+import json
+import time
+
+import frappe
+from frappe.utils import cint, flt, getdate, nowdate
+
+from vinfork_custom.instrumentation import instrument
+
+# Production Status Report results, cached per normalized filters.
+# Any Job Card, Work Order or Operation change bumps the generation, which
+# retires every cached result at once; the TTL is only a safety net.
+CACHE_PREFIX = "production_status_report"
+STATS_KEYS = ("hits", "misses", "rebuild_ms_total", "last_rebuild_ms")
+
+# Seconds a result may be served ("production_status_cache_ttl" in site_config.json, 0 disables)
+DEFAULT_TTL = 300
+
+
+def get_cached_data(filters, build):
+	"""Returns the cached rows for the filters, calling build() and caching on a miss"""
+	ttl = cint(frappe.conf.get("production_status_cache_ttl", DEFAULT_TTL))
+	if ttl <= 0:
+		return build()
+
+	key = _get_cache_key(filters)
+	data = frappe.cache.get_value(key)
+	if data is not None:
+		_incr("hits")
+		return data
+
+	start = time.monotonic()
+	data = build()
+	elapsed_ms = (time.monotonic() - start) * 1000
+
+	frappe.cache.set_value(key, data, expires_in_sec=ttl)
+	_incr("misses")
+	_incr("rebuild_ms_total", elapsed_ms)
+	frappe.cache.set(_raw_key("last_rebuild_ms"), elapsed_ms)
+
+	return data
+
+
+@instrument
+def invalidate_report_cache(doc=None, method=None, *args):
+	"""doc_events hook for Job Card, Work Order and Operation changes"""
+	# Bump once the change is visible to other connections, or a concurrent
+	# run could cache the old state under the new generation
+	frappe.db.after_commit.add(_bump_generation)
+
+
+@frappe.whitelist()
+@instrument
+def get_cache_stats():
+	"""Hit rate and rebuild time of the Production Status Report cache"""
+	frappe.only_for("System Manager")
+
+	stats = {key: flt(frappe.cache.get(_raw_key(key))) for key in STATS_KEYS}
+	requests = stats["hits"] + stats["misses"]
+
+	return {
+		"hits": cint(stats["hits"]),
+		"misses": cint(stats["misses"]),
+		"hit_rate": stats["hits"] / requests if requests else 0,
+		"avg_rebuild_ms": stats["rebuild_ms_total"] / stats["misses"] if stats["misses"] else 0,
+		"last_rebuild_ms": stats["last_rebuild_ms"],
+		"generation": _get_generation(),
+	}
+
+
+def _get_cache_key(filters):
+	normalized = {
+		"from_date": str(getdate(filters.get("from_date"))) if filters.get("from_date") else None,
+		"to_date": str(getdate(filters.get("to_date"))) if filters.get("to_date") else None,
+		"page_length": cint(filters.get("page_length")),
+		# The 7-day retention window moves with the date
+		"today": nowdate(),
+	}
+	digest = hashlib.md5(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+	return f"{CACHE_PREFIX}:{_get_generation()}:{digest}"
+
+
+def _get_generation():
+	return cint(frappe.cache.get(_raw_key("generation")))
+
+
+def _bump_generation():
+	frappe.cache.incr(_raw_key("generation"))
+
+
+def _incr(key, amount=1):
+	frappe.cache.incrbyfloat(_raw_key(key), amount)
+
+
+def _raw_key(key):
+	# Counters use plain redis commands, so they need the site prefix explicitly
+	return frappe.cache.make_key(f"{CACHE_PREFIX}:{key}")
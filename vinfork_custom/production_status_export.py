@@ -0,0 +1,134 @@
+import csv
+import os
+
+import frappe
+from frappe.utils import get_url
+
+from vinfork_custom.instrumentation import instrument
+from vinfork_custom.report.production_status_report.production_status_report import (
+	get_columns,
+	get_conditions,
+	get_data,
+)
+
+# Rows are fetched and written in chunks of this many Work Orders
+EXPORT_CHUNK_SIZE = 500
+# Bigger ranges are exported by a background job
+BACKGROUND_THRESHOLD = 2000
+
+
+@frappe.whitelist()
+@instrument
+def export_production_status(filters=None, file_format="CSV"):
+	"""
+	Streams the Production Status Report into a private CSV or XLSX file.
+	Small ranges return the file URL right away; large ranges are exported in the
+	background and the user gets a download link when the file is ready.
+	"""
+	if not frappe.get_doc("Report", "Production Status Report").is_permitted():
+		frappe.throw("Not permitted", frappe.PermissionError)
+
+	if file_format not in ("CSV", "Excel"):
+		frappe.throw("File format must be CSV or Excel.")
+
+	filters = frappe._dict(frappe.parse_json(filters) or {})
+
+	if count_work_orders(filters) > BACKGROUND_THRESHOLD:
+		frappe.enqueue(
+			"vinfork_custom.production_status_export.build_export",
+			queue="long",
+			timeout=60 * 60,
+			filters=filters,
+			file_format=file_format,
+			notify_user=frappe.session.user,
+		)
+		frappe.msgprint("The export is running in the background. You will get a download link when it is ready.")
+		return {"queued": True}
+
+	return {"file_url": build_export(filters, file_format)}
+
+
+def count_work_orders(filters):
+	conditions, values = get_conditions(filters)
+
+	return frappe.db.sql(f"""
+		SELECT COUNT(*) FROM `tabWork Order`
+		WHERE docstatus = 1 {conditions}
+	""", values)[0][0]
+
+
+def build_export(filters, file_format="CSV", notify_user=None):
+	"""Writes the report chunk by chunk, so memory stays flat however many Work Orders are in range"""
+	columns = get_columns()
+	fieldnames = [col["fieldname"] for col in columns]
+	extension = "xlsx" if file_format == "Excel" else "csv"
+	file_name = f"production-status-{frappe.generate_hash(length=10)}.{extension}"
+	path = frappe.get_site_path("private", "files", file_name)
+
+	writer = _XlsxWriter(path) if file_format == "Excel" else _CsvWriter(path)
+	try:
+		writer.write([col["label"] for col in columns])
+		for rows in iter_pages(filters):
+			for row in rows:
+				writer.write([row.get(fieldname) for fieldname in fieldnames])
+	finally:
+		writer.close()
+
+	file_doc = frappe.get_doc({
+		"doctype": "File",
+		"file_name": file_name,
+		"file_url": f"/private/files/{file_name}",
+		"file_size": os.path.getsize(path),
+		"is_private": 1,
+	}).insert(ignore_permissions=True)
+
+	if notify_user:
+		frappe.publish_realtime("msgprint",
+			f"Production Status export is ready: <a href='{get_url(file_doc.file_url)}'>{file_name}</a>",
+			user=notify_user)
+
+	return file_doc.file_url
+
+
+def iter_pages(filters):
+	"""Yields the report rows page by page, using the report's keyset pagination"""
+	filters = frappe._dict(filters, page_length=EXPORT_CHUNK_SIZE)
+
+	after = None
+	while True:
+		rows = get_data(filters, None, after=after)
+		if rows:
+			yield rows
+
+		if len(rows) < EXPORT_CHUNK_SIZE:
+			break
+
+		after = frappe._dict(planned_end_date=rows[-1]["planned_end_date"], work_order=rows[-1]["work_order"])
+
+
+class _CsvWriter:
+	def __init__(self, path):
+		self.file = open(path, "w", newline="", encoding="utf-8")
+		self.writer = csv.writer(self.file)
+
+	def write(self, row):
+		self.writer.writerow(row)
+
+	def close(self):
+		self.file.close()
+
+
+class _XlsxWriter:
+	def __init__(self, path):
+		from openpyxl import Workbook
+
+		# write_only workbooks stream rows to disk instead of keeping them in memory
+		self.path = path
+		self.workbook = Workbook(write_only=True)
+		self.sheet = self.workbook.create_sheet("Production Status")
+
+	def write(self, row):
+		self.sheet.append(row)
+
+	def close(self):
+		self.workbook.save(self.path)
@@ -0,0 +1,32 @@
+import frappe
+
+from vinfork_custom.operation_catalogue import get_operation_catalogue
+
+# Open Production Status Reports listen to this event and patch rows in place
+REALTIME_EVENT = "production_status_update"
+# Published to this doctype's room, which only users with read access can join
+REALTIME_DOCTYPE = "Work Order"
+
+
+def publish_deltas(rows, removed=None, operation=None):
+	"""
+	Publishes one compact delta per Work Order after commit:
+	{work_order, overall_status} plus the status column of the changed operation,
+	or {work_order, removed: 1} for Work Orders that left the report.
+	Without an operation (Work Order or Stock Entry changes) only the overall status is sent.
+	"""
+	fieldname = None
+	if operation:
+		fieldname = next((op.status_fieldname for op in get_operation_catalogue() if op.name == operation), None)
+
+	deltas = []
+	for row in rows:
+		delta = {"work_order": row["work_order"], "overall_status": row["overall_status"]}
+		if fieldname:
+			delta[fieldname] = row.get(fieldname)
+		deltas.append(delta)
+
+	deltas.extend({"work_order": name, "removed": 1} for name in removed or ())
+
+	if deltas:
+		frappe.publish_realtime(REALTIME_EVENT, deltas, doctype=REALTIME_DOCTYPE, after_commit=True)
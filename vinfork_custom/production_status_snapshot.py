@@ -0,0 +1,221 @@
+import json
+
+import frappe
+from frappe.utils import now
+
+from vinfork_custom.instrumentation import instrument
+from vinfork_custom.operation_catalogue import get_operation_catalogue
+from vinfork_custom.production_status_realtime import publish_deltas
+from vinfork_custom.report.production_status_report.production_status_report import (
+	WORK_ORDER_FIELDS,
+	build_rows,
+	get_conditions,
+	get_limit,
+)
+
+# Denormalized Production Status Report: one row per submitted Work Order.
+# Per-operation statuses are kept as JSON ({status_fieldname: status}) so that
+# adding or renaming an Operation needs no schema change.
+SNAPSHOT_TABLE = "__vinfork_production_status"
+READY_KEY = "production_status_snapshot_ready"
+REBUILD_CHUNK_SIZE = 500
+
+SNAPSHOT_COLUMNS = (
+	"work_order",
+	"sales_order",
+	"customer_name",
+	"production_item",
+	"qty",
+	"status",
+	"planned_start_date",
+	"planned_end_date",
+	"actual_end_date",
+	"operation_status",
+	"overall_status",
+	"modified",
+)
+
+
+def create_snapshot_table():
+	frappe.db.sql_ddl(f"""
+		CREATE TABLE IF NOT EXISTS `{SNAPSHOT_TABLE}` (
+			`work_order` VARCHAR(140) NOT NULL,
+			`sales_order` VARCHAR(140),
+			`customer_name` VARCHAR(140),
+			`production_item` VARCHAR(140),
+			`qty` DECIMAL(21,9) NOT NULL DEFAULT 0,
+			`status` VARCHAR(140),
+			`planned_start_date` DATETIME(6),
+			`planned_end_date` DATETIME(6),
+			`actual_end_date` DATETIME(6),
+			`operation_status` LONGTEXT,
+			`overall_status` VARCHAR(140),
+			`modified` DATETIME(6),
+			PRIMARY KEY (`work_order`),
+			KEY `planned_end_date_work_order` (`planned_end_date`, `work_order`),
+			KEY `planned_start_date` (`planned_start_date`),
+			KEY `status_actual_end_date` (`status`, `actual_end_date`)
+		) ENGINE=InnoDB ROW_FORMAT=DYNAMIC CHARACTER SET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+	""")
+
+
+def is_snapshot_ready():
+	return bool(frappe.db.get_global(READY_KEY))
+
+
+def get_snapshot_rows(filters, after=None, limit=0):
+	"""Report rows read from the snapshot with the report's own filters, a single indexed query"""
+	conditions, values = get_conditions(filters, after=after, name_field="work_order")
+
+	rows = frappe.db.sql(f"""
+		SELECT work_order, sales_order, planned_end_date, customer_name, production_item, qty,
+			operation_status, overall_status
+		FROM `{SNAPSHOT_TABLE}`
+		WHERE 1 = 1 {conditions}
+		ORDER BY planned_end_date ASC, work_order ASC
+		{get_limit(limit)}
+	""", values, as_dict=1)
+
+	operations = get_operation_catalogue()
+	for row in rows:
+		statuses = json.loads(row.pop("operation_status") or "{}")
+		for op in operations:
+			row[op.status_fieldname] = statuses.get(op.status_fieldname, "Not Started")
+
+	return rows
+
+
+def refresh_work_orders(wo_names):
+	"""
+	Recompute the report rows of the given Work Orders and store them in the snapshot;
+	rows of unsubmitted ones are removed. Returns (rows, removed_work_orders).
+	"""
+	wo_names = list({name for name in wo_names if name})
+	if not wo_names:
+		return [], set()
+
+	wos = frappe.db.sql(f"""
+		SELECT {WORK_ORDER_FIELDS}
+		FROM `tabWork Order`
+		WHERE docstatus = 1 AND name IN %(work_orders)s
+	""", {"work_orders": wo_names}, as_dict=1)
+
+	rows = build_rows(wos)
+	removed = set(wo_names) - {wo.work_order for wo in wos}
+
+	if SNAPSHOT_TABLE in frappe.db.get_tables():
+		if removed:
+			frappe.db.sql(f"DELETE FROM `{SNAPSHOT_TABLE}` WHERE work_order IN %s", [list(removed)])
+		_write_rows(wos, rows)
+
+	return rows, removed
+
+
+@instrument
+def on_work_order_change(doc, method=None):
+	"""doc_events hook for Work Order on_change/after_delete (on_change also fires on db_set)"""
+	publish_deltas(*refresh_work_orders([doc.name]))
+
+
+@instrument
+def on_job_card_change(doc, method=None):
+	"""doc_events hook for Job Card on_change/after_delete"""
+	publish_deltas(*refresh_work_orders([doc.work_order]), operation=doc.operation)
+
+
+@instrument
+def on_stock_entry_change(doc, method=None):
+	"""doc_events hook for Stock Entry on_submit/on_cancel: manufacturing updates the Work Order status"""
+	if doc.get("work_order"):
+		publish_deltas(*refresh_work_orders([doc.work_order]))
+
+
+@instrument
+def on_operation_change(doc=None, method=None, *args):
+	"""doc_events hook for Operation: the operation columns changed, so rebuild"""
+	if is_snapshot_ready():
+		enqueue_rebuild()
+
+
+@frappe.whitelist()
+@instrument
+def rebuild_snapshot():
+	"""Repair job: rebuild the whole snapshot in the background"""
+	frappe.only_for(("System Manager", "Manufacturing Manager"))
+
+	enqueue_rebuild()
+	frappe.msgprint("Production status snapshot rebuild queued.")
+
+
+def enqueue_rebuild():
+	frappe.enqueue("vinfork_custom.production_status_snapshot.rebuild",
+		queue="long", timeout=60 * 60, job_id="rebuild_production_status_snapshot", deduplicate=True,
+		enqueue_after_commit=True)
+
+
+def rebuild():
+	"""
+	Rebuilds the snapshot from Work Orders and Job Cards in chunks.
+	The report falls back to live computation until the rebuild finishes.
+	"""
+	create_snapshot_table()
+	frappe.db.set_global(READY_KEY, 0)
+	frappe.db.sql(f"DELETE FROM `{SNAPSHOT_TABLE}`")
+	frappe.db.commit()
+
+	last_name = ""
+	while True:
+		wos = frappe.db.sql(f"""
+			SELECT {WORK_ORDER_FIELDS}
+			FROM `tabWork Order`
+			WHERE docstatus = 1 AND name > %(last_name)s
+			ORDER BY name ASC
+			LIMIT %(limit)s
+		""", {"last_name": last_name, "limit": REBUILD_CHUNK_SIZE}, as_dict=1)
+		if not wos:
+			break
+
+		_write_rows(wos, build_rows(wos))
+		frappe.db.commit()
+		last_name = wos[-1].work_order
+
+	frappe.db.set_global(READY_KEY, 1)
+	frappe.db.commit()
+
+
+def _write_rows(wos, rows):
+	if not wos:
+		return
+
+	wo_map = {wo.work_order: wo for wo in wos}
+	operations = get_operation_catalogue()
+	timestamp = now()
+
+	values = []
+	for row in rows:
+		wo = wo_map[row["work_order"]]
+		statuses = {op.status_fieldname: row[op.status_fieldname] for op in operations}
+		values.append((
+			wo.work_order,
+			wo.sales_order,
+			row["customer_name"],
+			wo.production_item,
+			wo.qty,
+			wo.status,
+			wo.planned_start_date,
+			wo.planned_end_date,
+			wo.actual_end_date,
+			json.dumps(statuses),
+			row["overall_status"],
+			timestamp,
+		))
+
+	columns = ", ".join(f"`{c}`" for c in SNAPSHOT_COLUMNS)
+	placeholders = ", ".join(["(" + ", ".join(["%s"] * len(SNAPSHOT_COLUMNS)) + ")"] * len(values))
+	updates = ", ".join(f"`{c}` = VALUES(`{c}`)" for c in SNAPSHOT_COLUMNS if c != "work_order")
+
+	frappe.db.sql(f"""
+		INSERT INTO `{SNAPSHOT_TABLE}` ({columns})
+		VALUES {placeholders}
+		ON DUPLICATE KEY UPDATE {updates}
+	""", [v for row in values for v in row])
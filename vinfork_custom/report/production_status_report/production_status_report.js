@@ -13,8 +13,98 @@ frappe.query_reports["Production Status Report"] = {
             "fieldtype": "Date",
             "default": frappe.datetime.get_today(),
             "width": "80"
+        },
+        {
+            "fieldname": "page_length",
+            "label": __("Page Size"),
+            "fieldtype": "Int",
+            "default": 0,
+            "description": __("Load this many Work Orders at a time (0 loads all)"),
+            "width": "80"
         }
     ],
+    "onload": function (report) {
+        // Realtime deltas from Job Card / Work Order changes, patched into the shown rows
+        let refresh_datatable = frappe.utils.debounce(function () {
+            if (report.datatable) report.datatable.refresh(report.data);
+        }, 500);
+
+        // Deltas go to the Work Order room, joined only with read permission on Work Order
+        frappe.realtime.doctype_subscribe("Work Order");
+        frappe.realtime.off("production_status_update");
+        frappe.realtime.on("production_status_update", function (deltas) {
+            if (!report.data || frappe.get_route_str() !== "query-report/Production Status Report") return;
+
+            let changed = false;
+            (deltas || []).forEach(function (delta) {
+                let index = report.data.findIndex((row) => row.work_order === delta.work_order);
+                if (index === -1) return;
+
+                if (delta.removed) {
+                    report.data.splice(index, 1);
+                } else {
+                    Object.assign(report.data[index], delta);
+                }
+                changed = true;
+            });
+
+            if (changed) refresh_datatable();
+        });
+
+        // Streaming export, run in the background for large ranges
+        report.page.add_inner_button(__("Export CSV / Excel"), function () {
+            frappe.prompt({
+                fieldname: "file_format",
+                label: __("File Format"),
+                fieldtype: "Select",
+                options: "CSV\nExcel",
+                default: "CSV"
+            }, function (values) {
+                frappe.call({
+                    method: "vinfork_custom.production_status_export.export_production_status",
+                    args: { filters: report.get_values(), file_format: values.file_format },
+                    freeze: true,
+                    callback: function (r) {
+                        if (r.message && r.message.file_url) {
+                            window.open(r.message.file_url);
+                        }
+                    }
+                });
+            }, __("Export Production Status"), __("Export"));
+        });
+
+        // Keyset pagination: fetch the page after the last row shown
+        report.page.add_inner_button(__("Load More"), function () {
+            let filters = report.get_values();
+            if (!filters.page_length) {
+                frappe.msgprint(__("Set a Page Size to load the report page by page."));
+                return;
+            }
+
+            let data = report.data || [];
+            let last = data[data.length - 1];
+            if (!last) return;
+
+            frappe.call({
+                method: "vinfork_custom.report.production_status_report.production_status_report.get_page",
+                args: {
+                    filters: filters,
+                    after: { planned_end_date: last.planned_end_date, work_order: last.work_order }
+                },
+                freeze: true,
+                callback: function (r) {
+                    let rows = (r.message && r.message.rows) || [];
+                    if (rows.length) {
+                        report.data = data.concat(rows);
+                        report.datatable.refresh(report.data);
+                    }
+                    if (!r.message || !r.message.has_more) {
+                        frappe.show_alert({ message: __("All Work Orders loaded"), indicator: "green" });
+                    }
+                }
+            });
+        });
+    },
     "formatter": function (value, row, column, data, default_formatter) {
         value = default_formatter(value, row, column, data);
 
@@ -2,12 +2,22 @@
 # For license information, please see license.txt
 
 import frappe
-from frappe.utils import add_days, getdate, nowdate
+from frappe.utils import add_days, cint, get_datetime, getdate, nowdate
 
+from vinfork_custom.instrumentation import instrument
+from vinfork_custom.operation_catalogue import get_operation_catalogue
+from vinfork_custom.production_status_cache import get_cached_data
+
+WORK_ORDER_FIELDS = """
+	name as work_order, sales_order, production_item, qty,
+	status, planned_start_date, planned_end_date, actual_end_date, company
+"""
+
+@instrument
 def execute(filters=None):
 	if not filters: filters = {}
 	columns = get_columns()
-	data = get_data(filters, columns)
+	data = get_cached_data(filters, lambda: get_data(filters, columns))
 	return columns, data
 
 def get_columns():
@@ -55,12 +65,10 @@ def get_columns():
 	]
 	
 	# Dynamic Columns for Operations
-	# Fetch all active operations to create columns
-	active_ops = frappe.get_all("Operation", fields=["name"], order_by="idx asc, name asc")
-	
-	for op in active_ops:
+	# One column per Operation, from the cached catalogue
+	for op in get_operation_catalogue():
 		columns.append({
-			"fieldname": frappe.scrub(op.name) + "_status", # e.g. "frame_making_status"
+			"fieldname": op.status_fieldname, # e.g. "frame_making_status"
 			"label": op.name,
 			"fieldtype": "Data",
 			"width": 110
@@ -76,36 +84,47 @@ def get_columns():
 	
 	return columns
 
-def get_data(filters, columns):
+def get_data(filters, columns, after=None):
+	"""
+	Report rows. With a "page_length" filter only one page is returned,
+	starting after the (planned_end_date, work_order) cursor if one is given.
+	"""
+	from vinfork_custom.production_status_snapshot import get_snapshot_rows, is_snapshot_ready
+
+	limit = cint(filters.get("page_length"))
+
+	# Served from the incrementally maintained snapshot once it has been built
+	if is_snapshot_ready():
+		return get_snapshot_rows(filters, after=after, limit=limit)
+
 	# 1. Logic: Fetch Work Orders
-	# - Show all Open/In Process
-	# - Show Completed ONLY if completed within last 7 days
-	
-	conditions = ""
-	if filters.get("from_date") and filters.get("to_date"):
-		conditions += f" AND planned_start_date BETWEEN '{filters.get('from_date')}' AND '{filters.get('to_date')}'"
+	filtered_wos = get_work_orders(filters, after=after, limit=limit)
 
-	wos = frappe.db.sql(f"""
-		SELECT 
-			name as work_order, sales_order, production_item, qty, 
-			status, planned_end_date, actual_end_date, company
-		FROM `tabWork Order`
-		WHERE docstatus = 1 {conditions}
-		ORDER BY planned_end_date ASC
-	""", as_dict=1)
+	return build_rows(filtered_wos)
 
-	# 7-Day Retention Logic for Completed Orders
-	today = getdate(nowdate())
-	seven_days_ago = add_days(today, -7)
-	
-	filtered_wos = []
-	for wo in wos:
-		if wo.status == "Completed":
-			# If completed before 7 days ago, skip it
-			if wo.actual_end_date and getdate(wo.actual_end_date) < seven_days_ago:
-				continue
-		filtered_wos.append(wo)
 
+@frappe.whitelist()
+@instrument
+def get_page(filters, after=None):
+	"""
+	Next page of the report for the "Load More" button (keyset pagination).
+	after is {"planned_end_date", "work_order"} of the last row already shown.
+	"""
+	if not frappe.get_doc("Report", "Production Status Report").is_permitted():
+		frappe.throw("Not permitted", frappe.PermissionError)
+
+	filters = frappe._dict(frappe.parse_json(filters) or {})
+	after = frappe._dict(frappe.parse_json(after)) if after else None
+	if not cint(filters.get("page_length")):
+		frappe.throw("Set a Page Size to load the report page by page.")
+
+	rows = get_data(filters, None, after=after)
+
+	return {"rows": rows, "has_more": len(rows) == cint(filters.page_length)}
+
+
+def build_rows(filtered_wos):
+	"""Report rows (operation columns and overall status) for the given Work Orders"""
 	if not filtered_wos:
 		return []
 
@@ -120,27 +139,12 @@ def get_data(filters, columns):
 			for r in res:
 				so_customer_map[r.name] = r.customer_name
 
-	# 3. Fetch Job Cards
-	# We need operation, status, docstatus
-	job_cards = frappe.db.get_all("Job Card", 
-		filters={"work_order": ["in", wo_names], "docstatus": ["!=", 2]},
-		fields=["work_order", "operation", "status", "docstatus"])
-	
-	# Group Job Cards by Work Order AND Operation
-	# jc_map[work_order][operation_name] = [list of cards]
-	jc_map = {}
-	for jc in job_cards:
-		if jc.work_order not in jc_map:
-			jc_map[jc.work_order] = {}
-		
-		# Normalize operation name key
-		if jc.operation not in jc_map[jc.work_order]:
-			jc_map[jc.work_order][jc.operation] = []
-			
-		jc_map[jc.work_order][jc.operation].append(jc)
+	# 3. Job Card counts per Work Order AND Operation, aggregated in the database
+	# jc_counts[(work_order, operation_name)] = {total, done, wip}
+	jc_counts = get_job_card_counts(wo_names)
 
 	# 4. Construct Rows
-	active_ops_list = frappe.get_all("Operation", fields=["name"], order_by="idx asc, name asc")
+	active_ops_list = get_operation_catalogue()
 	
 	data = []
 	for wo in filtered_wos:
@@ -158,39 +162,20 @@ def get_data(filters, columns):
 		completed_ops_count = 0
 		started_ops_count = 0
 		
-		wo_cards = jc_map.get(wo.work_order, {})
-		
 		for op in active_ops_list:
-			field_name = frappe.scrub(op.name) + "_status"
+			field_name = op.status_fieldname
 			
-			# Find Job Cards for this specific Operation
-			# Be careful with exact string matching logic if names vary slightly
+			# Job Card counts for this specific Operation
 			# Here we assume exact match on 'operation' link field
-			cards = wo_cards.get(op.name, [])
+			counts = jc_counts.get((wo.work_order, op.name))
 			
-			status_text = "Not Started" # Default
-			
-			if not cards:
-				# No job card created for this op yet
-				status_text = "Not Started"
-			else:
+			status_text = get_operation_status(counts)
+			if counts:
 				total_ops_count += 1
-				
-				# Analyze Status
-				# Priority: Done > WIP > Not Started (Open)
-				
-				all_done = all(c.docstatus == 1 or c.status == "Completed" for c in cards)
-				any_wip = any(c.status == "Work In Progress" for c in cards)
-				
-				if all_done:
-					status_text = "Done"
+				if status_text == "Done":
 					completed_ops_count += 1
-				elif any_wip:
-					status_text = "WIP"
+				elif status_text == "WIP":
 					started_ops_count += 1
-				else:
-					# Cards exist (Open) but none started
-					status_text = "Not Started"
 			
 			row[field_name] = status_text
 
@@ -225,3 +210,94 @@ def get_data(filters, columns):
 
 	return data
 
+
+def get_work_orders(filters, after=None, limit=0):
+	"""
+	Submitted Work Orders to show, ordered by due date:
+	- Show all Open/In Process
+	- Show Completed ONLY if completed within last 7 days
+	"""
+	conditions, values = get_conditions(filters, after=after)
+
+	return frappe.db.sql(f"""
+		SELECT {WORK_ORDER_FIELDS}
+		FROM `tabWork Order`
+		WHERE docstatus = 1 {conditions}
+		ORDER BY planned_end_date ASC, name ASC
+		{get_limit(limit)}
+	""", values, as_dict=1)
+
+
+def get_limit(limit):
+	return f"LIMIT {cint(limit)}" if cint(limit) > 0 else ""
+
+
+def get_conditions(filters, after=None, name_field="name"):
+	"""
+	Retention and date filters as bound parameters for the WHERE clause,
+	so only displayed rows leave the database.
+	after adds the keyset condition for rows following (planned_end_date, name),
+	matching ORDER BY planned_end_date, name (NULL dates sort first).
+	"""
+	values = {
+		# 7-Day Retention Logic for Completed Orders
+		"retention_from": add_days(getdate(nowdate()), -7),
+	}
+
+	conditions = " AND (status != 'Completed' OR actual_end_date IS NULL OR actual_end_date >= %(retention_from)s)"
+	if filters.get("from_date") and filters.get("to_date"):
+		conditions += " AND planned_start_date BETWEEN %(from_date)s AND %(to_date)s"
+		values["from_date"] = getdate(filters.get("from_date"))
+		values["to_date"] = getdate(filters.get("to_date"))
+
+	if after:
+		values["after_name"] = after.work_order
+		if after.planned_end_date:
+			values["after_end_date"] = get_datetime(after.planned_end_date)
+			conditions += f""" AND (planned_end_date > %(after_end_date)s
+				OR (planned_end_date = %(after_end_date)s AND {name_field} > %(after_name)s))"""
+		else:
+			conditions += f""" AND (planned_end_date IS NOT NULL
+				OR (planned_end_date IS NULL AND {name_field} > %(after_name)s))"""
+
+	return conditions, values
+
+
+def get_job_card_counts(wo_names):
+	"""
+	Per Work Order and Operation: total Job Cards, how many are submitted or Completed,
+	and how many are Work In Progress. One GROUP BY query, keyed by (work_order, operation).
+	"""
+	if not wo_names:
+		return {}
+
+	rows = frappe.db.sql("""
+		SELECT
+			work_order, operation,
+			COUNT(*) AS total,
+			SUM(CASE WHEN docstatus = 1 OR status = 'Completed' THEN 1 ELSE 0 END) AS done,
+			SUM(CASE WHEN status = 'Work In Progress' THEN 1 ELSE 0 END) AS wip
+		FROM `tabJob Card`
+		WHERE work_order IN %(work_orders)s AND docstatus != 2
+		GROUP BY work_order, operation
+	""", {"work_orders": wo_names}, as_dict=1)
+
+	return {(r.work_order, r.operation): r for r in rows}
+
+
+def get_operation_status(counts):
+	"""
+	Status of one operation from its Job Card counts.
+	Priority: Done > WIP > Not Started (Open or no Job Card yet)
+	"""
+	if not counts or not counts.total:
+		# No job card created for this op yet
+		return "Not Started"
+
+	if counts.done == counts.total:
+		return "Done"
+	if counts.wip:
+		return "WIP"
+
+	# Cards exist (Open) but none started
+	return "Not Started"
@@ -0,0 +1,104 @@
+from array import array
+
+import frappe
+from frappe.utils import flt
+
+from vinfork_custom.instrumentation import instrument
+from vinfork_custom.stock_sheet import build_item_name_index, get_sheet_path, iter_stock_sheet, resolve_item
+
+try:
+	import numpy as np
+except ImportError:  # numpy is not a hard dependency of the bench
+	np = None
+
+
+@frappe.whitelist()
+@instrument
+def get_stock_discrepancies(file, warehouse=None, threshold=0):
+	"""
+	Compares an attached stock sheet's QTY and CLOSING STOCK columns with Bin.actual_qty.
+	file is the File name or file_url of the sheet; the user must be able to read it.
+	The sheet and the Bin balances are loaded once each and compared column-wise;
+	items whose closing stock differs from the Bin by more than threshold are flagged.
+	Without a warehouse, balances are summed over all warehouses.
+
+	bench --site <site> execute vinfork_custom.stock_discrepancy.get_stock_discrepancies \\
+		--kwargs "{'file': '/private/files/STOCK-20.01.2026.csv', 'threshold': 1}"
+	"""
+	if not frappe.has_permission("Bin", "read"):
+		frappe.throw("You do not have permission to read stock balances.")
+
+	file_path = get_sheet_path(file)
+	index = build_item_name_index()
+
+	# Sheet as columns, one entry per item (racks holding the same item are added up)
+	positions = {}
+	item_codes, sheet_qty, closing_stock = [], array("d"), array("d")
+	unmatched = []
+	for row in iter_stock_sheet(file_path):
+		item_code = resolve_item(row, index)
+		if not item_code:
+			unmatched.append({"line": row.line, "material_name": row.material_name})
+			continue
+
+		if item_code not in positions:
+			positions[item_code] = len(item_codes)
+			item_codes.append(item_code)
+			sheet_qty.append(0)
+			closing_stock.append(0)
+
+		i = positions[item_code]
+		sheet_qty[i] += flt(row.qty)
+		closing_stock[i] += flt(row.closing_stock)
+
+	bin_qty = array("d", [0] * len(item_codes))
+	for item_code, actual_qty in _get_bin_balances(item_codes, warehouse):
+		bin_qty[positions[item_code]] = flt(actual_qty)
+
+	closing_diff, qty_diff, flagged = _compare(closing_stock, sheet_qty, bin_qty, flt(threshold))
+
+	rows = [
+		{
+			"item_code": item_codes[i],
+			"sheet_qty": sheet_qty[i],
+			"closing_stock": closing_stock[i],
+			"bin_qty": bin_qty[i],
+			"closing_difference": closing_diff[i],
+			"qty_difference": qty_diff[i],
+		}
+		for i in flagged
+	]
+	rows.sort(key=lambda row: abs(row["closing_difference"]), reverse=True)
+
+	return {"checked": len(item_codes), "mismatches": rows, "unmatched": unmatched}
+
+
+def _get_bin_balances(item_codes, warehouse=None):
+	if not item_codes:
+		return []
+
+	conditions = "AND warehouse = %(warehouse)s" if warehouse else ""
+	return frappe.db.sql(f"""
+		SELECT item_code, SUM(actual_qty)
+		FROM `tabBin`
+		WHERE item_code IN %(item_codes)s {conditions}
+		GROUP BY item_code
+	""", {"item_codes": item_codes, "warehouse": warehouse})
+
+
+def _compare(closing_stock, sheet_qty, bin_qty, threshold):
+	"""Returns (closing - bin, qty - bin, indexes where |closing - bin| > threshold)"""
+	if not bin_qty:
+		return [], [], []
+
+	if np is not None:
+		bins = np.frombuffer(bin_qty, dtype=np.float64)
+		closing_diff = np.frombuffer(closing_stock, dtype=np.float64) - bins
+		qty_diff = np.frombuffer(sheet_qty, dtype=np.float64) - bins
+		flagged = np.flatnonzero(np.abs(closing_diff) > threshold)
+		return closing_diff.tolist(), qty_diff.tolist(), flagged.tolist()
+
+	closing_diff = [c - b for c, b in zip(closing_stock, bin_qty, strict=True)]
+	qty_diff = [q - b for q, b in zip(sheet_qty, bin_qty, strict=True)]
+	flagged = [i for i, diff in enumerate(closing_diff) if abs(diff) > threshold]
+	return closing_diff, qty_diff, flagged
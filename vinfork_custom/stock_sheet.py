@@ -0,0 +1,234 @@
+import codecs
+import csv
+import re
+
+import frappe
+from frappe.utils import cint, flt, nowdate
+
+from vinfork_custom.instrumentation import instrument
+
+# Warehouse stock sheets (datasets/STOCK-*.csv): banner rows name the company and the
+# material section ("HARDWARE MATERIALS"), followed by a header row and the rack rows.
+COLUMN_ALIASES = {
+	"RACK NO": "rack_no",
+	"MATERIAL NAME": "material_name",
+	"QTY": "qty",
+	"UAM": "uom",
+	"UOM": "uom",
+	"CLOSING STOCK": "closing_stock",
+}
+
+
+def iter_stock_sheet(file_path):
+	"""
+	Streams the sheet row by row, yielding
+	{line, section, rack_no, material_name, qty, uom, closing_stock} for material rows.
+	section is the last banner row seen before the row.
+	"""
+	section = None
+	columns = None
+
+	with open(file_path, newline="", encoding=_detect_encoding(file_path)) as f:
+		for line, cells in enumerate(csv.reader(f), start=1):
+			cells = [c.strip() for c in cells]
+			if not any(cells):
+				continue
+
+			# Banner: only the first cell is filled
+			if cells[0] and not any(cells[1:]):
+				section = " ".join(cells[0].split())
+				continue
+
+			normalized = [" ".join(c.upper().split()) for c in cells]
+			if "MATERIAL NAME" in normalized:
+				columns = {i: COLUMN_ALIASES[c] for i, c in enumerate(normalized) if c in COLUMN_ALIASES}
+				continue
+
+			if not columns:
+				continue
+
+			row = frappe._dict(line=line, section=section)
+			for i, fieldname in columns.items():
+				row[fieldname] = cells[i] if i < len(cells) else ""
+
+			if row.material_name:
+				yield row
+
+
+def _detect_encoding(file_path):
+	"""Sheets saved from Excel are often cp1252 rather than UTF-8"""
+	decoder = codecs.getincrementaldecoder("utf-8-sig")()
+	with open(file_path, "rb") as f:
+		try:
+			while chunk := f.read(64 * 1024):
+				decoder.decode(chunk)
+			decoder.decode(b"", final=True)
+		except UnicodeDecodeError:
+			return "cp1252"
+
+	return "utf-8-sig"
+
+
+def build_item_name_index():
+	"""{normalized name: item_code} over all Item codes and names, one query"""
+	index = {}
+	for item in frappe.get_all("Item", filters={"disabled": 0}, fields=["name", "item_name"]):
+		index.setdefault(normalize_material_name(item.name), item.name)
+		if item.item_name:
+			index.setdefault(normalize_material_name(item.item_name), item.name)
+
+	return index
+
+
+def normalize_material_name(name, rack_no=None):
+	"""
+	Key for matching sheet names to Items: case, spacing and punctuation are ignored,
+	"*" counts as "x" (6*13MM = 6X13MM) and the rack number prefix ("7-HT HEX BOLT") is dropped.
+	"""
+	name = (name or "").upper()
+	if rack_no and name.startswith(f"{rack_no}-"):
+		name = name[len(rack_no) + 1 :]
+
+	return re.sub(r"[^A-Z0-9]", "", name.replace("*", "X"))
+
+
+def resolve_item(row, index):
+	return index.get(normalize_material_name(row.material_name, row.rack_no)) or index.get(
+		normalize_material_name(row.material_name)
+	)
+
+
+def get_sheet_path(file):
+	"""
+	Full path of an attached stock sheet, given its File name or file_url.
+	The user must be able to read the File.
+	"""
+	name = frappe.db.get_value("File", {"file_url": file} if file.startswith("/") else file)
+	if not name:
+		frappe.throw(f"File {file} not found", frappe.DoesNotExistError)
+
+	file_doc = frappe.get_doc("File", name)
+	file_doc.check_permission("read")
+	if not (file_doc.file_name or "").lower().endswith(".csv"):
+		frappe.throw("Stock sheets must be CSV files.")
+
+	return file_doc.get_full_path()
+
+
+@frappe.whitelist()
+@instrument
+def import_stock_sheet(file, company=None, posting_date=None, submit=0):
+	"""
+	Queues the import of an attached stock sheet (File name or file_url) as one
+	Stock Reconciliation per warehouse section, setting each matched Item to its CLOSING STOCK.
+	Sections map to warehouses through "stock_sheet_warehouses" in site_config.json
+	({"HARDWARE MATERIALS": "Hardware - VLW"}) or a Warehouse of the same name.
+	"""
+	if not frappe.has_permission("Stock Reconciliation", "create"):
+		frappe.throw("You do not have permission to create Stock Reconciliations.")
+
+	file_path = get_sheet_path(file)
+	frappe.enqueue(
+		"vinfork_custom.stock_sheet.run_stock_sheet_import",
+		queue="long",
+		timeout=60 * 60,
+		job_id=f"stock_sheet_import::{file}",
+		deduplicate=True,
+		file_path=file_path,
+		company=company or frappe.defaults.get_user_default("Company"),
+		posting_date=posting_date or nowdate(),
+		submit=cint(submit),
+		notify_user=frappe.session.user,
+	)
+	frappe.msgprint("Stock sheet import queued. You will be notified when it finishes.")
+
+
+def run_stock_sheet_import(file_path, company, posting_date, submit=0, notify_user=None):
+	"""
+	Background job of import_stock_sheet. Unmatched material names and failed
+	sections go to the Error Log; the user gets a summary.
+	"""
+	index = build_item_name_index()
+	warehouses = _get_section_warehouses(company)
+
+	report = {"stock_reconciliations": [], "unmatched": [], "errors": []}
+	section, items = None, {}
+
+	def flush():
+		if items:
+			_make_reconciliation(section, items, warehouses, company, posting_date, cint(submit), report)
+
+	for row in iter_stock_sheet(file_path):
+		if row.section != section:
+			flush()
+			section, items = row.section, {}
+
+		item_code = resolve_item(row, index)
+		if not item_code:
+			report["unmatched"].append({"line": row.line, "material_name": row.material_name})
+			continue
+
+		# Same material on two racks: one reconciliation row with the total
+		items[item_code] = items.get(item_code, 0) + flt(row.closing_stock)
+
+	flush()
+
+	if report["unmatched"] or report["errors"]:
+		frappe.log_error(
+			"\n".join(
+				[f"Line {u['line']}: no Item matches {u['material_name']}" for u in report["unmatched"]]
+				+ [f"Section {e['section']}: {e['error']}" for e in report["errors"]]
+			),
+			"Stock Sheet Import",
+		)
+
+	if notify_user:
+		frappe.publish_realtime("msgprint",
+			f"Stock sheet import finished: {len(report['stock_reconciliations'])} Stock Reconciliations, "
+			f"{len(report['unmatched'])} unmatched rows, {len(report['errors'])} failed sections (see Error Log).",
+			user=notify_user)
+
+	return report
+
+
+def _get_section_warehouses(company):
+	"""{SECTION TITLE: warehouse} from site config, falling back to same-named warehouses of the company"""
+	warehouses = {
+		title.upper(): warehouse
+		for title, warehouse in (frappe.conf.get("stock_sheet_warehouses") or {}).items()
+	}
+
+	for warehouse in frappe.get_all("Warehouse", filters={"company": company, "is_group": 0},
+			fields=["name", "warehouse_name"]):
+		warehouses.setdefault((warehouse.warehouse_name or "").upper(), warehouse.name)
+
+	return warehouses
+
+
+def _make_reconciliation(section, items, warehouses, company, posting_date, submit, report):
+	warehouse = warehouses.get((section or "").upper())
+	if not warehouse:
+		report["errors"].append({"section": section, "error": f"No warehouse mapped for section {section}"})
+		return
+
+	sr = frappe.get_doc({
+		"doctype": "Stock Reconciliation",
+		"company": company,
+		"purpose": "Stock Reconciliation",
+		"posting_date": posting_date,
+		"set_posting_time": 1,
+		"items": [{"item_code": item_code, "warehouse": warehouse, "qty": qty} for item_code, qty in items.items()],
+	})
+
+	frappe.db.savepoint("stock_sheet_section")
+	try:
+		sr.insert()
+		if submit:
+			sr.submit()
+	except Exception as e:
+		frappe.db.rollback(save_point="stock_sheet_section")
+		report["errors"].append({"section": section, "error": str(e)})
+		return
+
+	report["stock_reconciliations"].append({"section": section, "warehouse": warehouse, "name": sr.name,
+		"rows": len(items)})
@@ -0,0 +1,162 @@
+import json
+import time
+
+import frappe
+from frappe.utils import add_days, get_datetime, get_time, now_datetime
+
+from vinfork_custom.bom_update_tool import rebaseline_boms
+
+CHECKPOINT_KEY = "vinfork_bom_rebaseline_checkpoint"
+# Work Orders re-baselined per commit; an item's Work Orders are never split across chunks
+CHUNK_SIZE = 200
+# Work Orders taken into one run; the rest wait for the next night
+MAX_WORK_ORDERS_PER_RUN = 5000
+
+# Overridable in site_config.json:
+# "bom_rebaseline_window": ["00:00", "06:00"]  run only between these times (may cross midnight)
+# "bom_rebaseline_time_budget": 1800           seconds per run
+# "bom_rebaseline_start_days": 7               look-back of the first run, without a checkpoint
+DEFAULT_WINDOW = ("00:00", "06:00")
+DEFAULT_TIME_BUDGET = 30 * 60
+DEFAULT_START_DAYS = 7
+
+
+def rebaseline_completed_work_orders():
+	"""
+	scheduler_events (daily_long): re-baselines BOMs from the Work Orders completed
+	since the last run. The run covers the Work Orders after the checkpoint in
+	(actual_end_date, name) order, groups them by item and re-baselines each item
+	once, pooling all its Work Orders, so an item gets at most one new BOM version.
+	Items are processed in bounded chunks; every chunk commits together with the
+	list of finished items, so an interrupted run resumes with the remaining items.
+	Stops when the time budget is spent or the window closes, before the morning shift.
+	"""
+	deadline = _get_deadline()
+	if not deadline:
+		return
+
+	state = _get_state()
+	wos = _get_work_orders(state)
+	if not wos:
+		return
+
+	# The run's range is fixed on its first pass, so a resumed run sees the same Work Orders
+	state["end"] = state.get("end") or {"actual_end_date": str(wos[-1].actual_end_date), "name": wos[-1].name}
+
+	done_items = set(state["done_items"])
+	groups = {}
+	for wo in wos:
+		if wo.production_item not in done_items:
+			groups.setdefault(wo.production_item, []).append(wo.name)
+
+	report = {"items": 0, "updated": 0, "skipped": 0, "failed": 0}
+	for chunk in _chunk_by_item(groups):
+		if time.monotonic() >= deadline:
+			return report
+
+		try:
+			result = rebaseline_boms(work_orders=[name for _, names in chunk for name in names])
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(f"BOM re-baseline stopped at items {[item for item, _ in chunk]}", "BOM Update Tool")
+			return report
+
+		state["done_items"].extend(item for item, _ in chunk)
+		_set_state(state)
+		frappe.db.commit()
+
+		report["items"] += len(chunk)
+		for key in ("updated", "skipped", "failed"):
+			report[key] += len(result[key])
+
+	# Range finished: the next run starts after it
+	_set_state({"start": state["end"], "end": None, "done_items": []})
+	frappe.db.commit()
+
+	return report
+
+
+def _chunk_by_item(groups):
+	"""[(item, work_orders)] chunks of about CHUNK_SIZE Work Orders, whole items only"""
+	chunk, size = [], 0
+	for item, names in groups.items():
+		if chunk and size + len(names) > CHUNK_SIZE:
+			yield chunk
+			chunk, size = [], 0
+
+		chunk.append((item, names))
+		size += len(names)
+
+	if chunk:
+		yield chunk
+
+
+def _get_deadline():
+	"""time.monotonic() value to stop at, or None outside the run window"""
+	start, end = (get_time(t) for t in frappe.conf.get("bom_rebaseline_window") or DEFAULT_WINDOW)
+	now = now_datetime()
+
+	if start <= end:
+		in_window = start <= now.time() < end
+	else:
+		# The window crosses midnight, e.g. 22:00-05:00
+		in_window = now.time() >= start or now.time() < end
+	if not in_window:
+		return None
+
+	window_end = get_datetime(f"{now.date()} {end}")
+	if window_end <= now:
+		window_end = add_days(window_end, 1)
+
+	budget = frappe.conf.get("bom_rebaseline_time_budget", DEFAULT_TIME_BUDGET)
+
+	return time.monotonic() + min((window_end - now).total_seconds(), budget)
+
+
+def _get_work_orders(state):
+	"""Completed Work Orders after the run's start, up to its end once that is fixed (keyset pagination)"""
+	values = {
+		"start_date": get_datetime(state["start"]["actual_end_date"]),
+		"start_name": state["start"]["name"],
+		"limit": MAX_WORK_ORDERS_PER_RUN,
+	}
+
+	end_condition = ""
+	if state.get("end"):
+		values["end_date"] = get_datetime(state["end"]["actual_end_date"])
+		values["end_name"] = state["end"]["name"]
+		end_condition = """AND (actual_end_date < %(end_date)s
+			OR (actual_end_date = %(end_date)s AND name <= %(end_name)s))"""
+
+	return frappe.db.sql(f"""
+		SELECT name, production_item, actual_end_date
+		FROM `tabWork Order`
+		WHERE docstatus = 1
+			AND status IN ('Completed', 'Closed')
+			AND actual_end_date IS NOT NULL
+			AND (actual_end_date > %(start_date)s
+				OR (actual_end_date = %(start_date)s AND name > %(start_name)s))
+			{end_condition}
+		ORDER BY actual_end_date ASC, name ASC
+		LIMIT %(limit)s
+	""", values, as_dict=1)
+
+
+def _get_state():
+	"""{start, end, done_items}: the run's range after start (end fixed once the run began) and finished items"""
+	state = frappe.db.get_global(CHECKPOINT_KEY)
+	if state:
+		state = json.loads(state)
+		# Checkpoints of the chunk-by-chunk job were a bare (actual_end_date, name)
+		return state if "start" in state else {"start": state, "end": None, "done_items": []}
+
+	start_days = frappe.conf.get("bom_rebaseline_start_days", DEFAULT_START_DAYS)
+	return {
+		"start": {"actual_end_date": str(add_days(now_datetime(), -start_days)), "name": ""},
+		"end": None,
+		"done_items": [],
+	}
+
+
+def _set_state(state):
+	frappe.db.set_global(CHECKPOINT_KEY, json.dumps(state))
@@ -1,5 +1,24 @@
+import time
+
 import frappe
 
+# The predicates our queries filter on, shared with the index patch;
+# each predicate's columns must form a prefix of some index of its table
+from vinfork_custom.patches.add_composite_indexes import COMPOSITE_INDEXES
+
+# Filtered on without a composite index of ours: Work Order status in the nightly
+# re-baseline and bom_update_tool, covered by ERPNext's own index on status
+OTHER_PREDICATES = (
+    ("Work Order", ("status",)),
+)
+INDEXED_PREDICATES = tuple((doctype, columns) for doctype, _, columns in COMPOSITE_INDEXES) + OTHER_PREDICATES
+
+# Milliseconds a dry run may take on live data (best of TIMING_RUNS)
+REPORT_BUDGET_MS = 2000
+PREFETCH_BUDGET_MS = 200
+PREFETCH_ITEMS = 200
+TIMING_RUNS = 3
+
 def check():
     print("---------------------------------------------------")
     print("🔍 Starting Deployment Verification for Vinfork Custom")
@@ -37,5 +56,83 @@ def check():
     except Exception as e:
         print(f"❌ ERROR checking hooks: {e}")
 
+    # 3. Check Indexes
+    print("---------------------------------------------------")
+    for doctype, columns in INDEXED_PREDICATES:
+        predicate = f"'tab{doctype}' ({', '.join(columns)})"
+        try:
+            index_name = get_covering_index(doctype, columns)
+        except Exception as e:
+            print(f"❌ ERROR reading indexes of 'tab{doctype}': {e}")
+            continue
+
+        if index_name:
+            print(f"✅ SUCCESS: {predicate} is covered by index {index_name}.")
+        else:
+            print(f"❌ FAILURE: {predicate} is not covered by any index.")
+            print("   👉 Solution: Run 'bench migrate' to apply the index patches.")
+
+    # 4. Time Dry Runs Against Live Data
+    print("---------------------------------------------------")
+    try:
+        from vinfork_custom.report.production_status_report.production_status_report import (
+            get_columns,
+            get_data,
+        )
+
+        # get_data directly, so the report cache does not hide the real cost
+        columns = get_columns()
+        print_timing("Production Status Report", REPORT_BUDGET_MS, lambda: get_data(frappe._dict(), columns))
+    except Exception as e:
+        print(f"❌ ERROR timing Production Status Report: {e}")
+
+    try:
+        from vinfork_custom.auto_bom import _prefetch_item_state
+
+        # The items of the most recent Sales Orders, as a submit would see them
+        item_codes = [row[0] for row in frappe.db.sql("""
+            SELECT item_code FROM `tabSales Order Item`
+            WHERE docstatus = 1
+            GROUP BY item_code
+            ORDER BY MAX(creation) DESC
+            LIMIT %s
+        """, PREFETCH_ITEMS)]
+        print_timing(f"Auto-BOM prefetch ({len(item_codes)} items)", PREFETCH_BUDGET_MS,
+                     lambda: _prefetch_item_state(item_codes))
+    except Exception as e:
+        print(f"❌ ERROR timing Auto-BOM prefetch: {e}")
+
     print("---------------------------------------------------")
     print("Verification Complete.")
+
+
+def get_covering_index(doctype, columns):
+    """Name of an index of the doctype's table that starts with columns, in order, or None"""
+    indexes = {}
+    for row in frappe.db.sql(f"SHOW INDEX FROM `tab{doctype}`", as_dict=True):
+        indexes.setdefault(row.Key_name, {})[row.Seq_in_index] = row.Column_name
+
+    for index_name, index_columns in indexes.items():
+        if tuple(index_columns.get(seq) for seq in range(1, len(columns) + 1)) == tuple(columns):
+            return index_name
+
+    return None
+
+
+def print_timing(label, budget_ms, fn):
+    from vinfork_custom.instrumentation import count_queries
+
+    timings = []
+    for _ in range(TIMING_RUNS):
+        with count_queries() as counter:
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    best = min(timings)
+    summary = f"{label}: {best:.0f} ms (budget {budget_ms} ms, {counter.queries} queries, first run {timings[0]:.0f} ms)"
+    if best <= budget_ms:
+        print(f"✅ SUCCESS: {summary}")
+    else:
+        print(f"❌ FAILURE: {summary}")
+        print("   👉 Solution: Check the indexes above and the slow-call log (instrumentation.get_slow_calls).")